@@ -0,0 +1,138 @@
+"""plaid metadata jsonb
+
+Revision ID: 103bbead685e
+Revises: 37ed9936e2e7
+Create Date: 2026-10-18 18:41:12.270164
+
+"""
+
+import ast
+import pprint
+from datetime import date, datetime
+from typing import Any, Callable, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from dateutil import tz
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "103bbead685e"
+down_revision: Union[str, None] = "37ed9936e2e7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ["account", "category", "institution", "transaction", "user_institution_link"]
+BATCH_SIZE = 1000
+
+# Calls that appear in the pprint output of plaid models' to_str()
+CALLS: dict[str, Callable[..., Any]] = {
+    "datetime.date": date,
+    "datetime.datetime": datetime,
+    "tzutc": tz.tzutc,
+    "tzlocal": tz.tzlocal,
+    "tzoffset": tz.tzoffset,
+}
+
+
+def literal(node: ast.expr) -> Any:
+    # ast.literal_eval extended with the calls above, dates as ISO strings
+    match node:
+        case ast.Call(func=func, args=args, keywords=keywords) if (
+            ast.unparse(func) in CALLS
+        ):
+            value = CALLS[ast.unparse(func)](
+                *[literal(arg) for arg in args],
+                **{kw.arg: literal(kw.value) for kw in keywords if kw.arg},
+            )
+            return value.isoformat() if isinstance(value, date) else value
+        case ast.Dict(keys=keys, values=values):
+            return {literal(k): literal(v) for k, v in zip(keys, values) if k}
+        case ast.List(elts=elts) | ast.Tuple(elts=elts):
+            return [literal(elt) for elt in elts]
+        case _:
+            return ast.literal_eval(node)
+
+
+def parse_metadata(table: str, value: str) -> Any:
+    try:
+        return literal(ast.parse(value, mode="eval").body)
+    except (SyntaxError, ValueError):
+        if table == "category":
+            # get_all_plaid_categories stored the bare plaid_id
+            return {"primary": value}
+        raise
+
+
+def convert(
+    table: str,
+    source: str,
+    target: str,
+    target_type: sa.types.TypeEngine[Any],
+    f: Callable[[Any], Any],
+) -> None:
+    # Keyset-paginated batches so that large tables are not loaded in memory
+    connection = op.get_bind()
+    t = sa.table(
+        table,
+        sa.column("id", sa.Integer()),
+        sa.column(source),
+        sa.column(target, target_type),
+    )
+    statement = (
+        t.update()
+        .where(t.c.id == sa.bindparam("_id"))
+        .values({target: sa.bindparam("_value", type_=target_type)})
+    )
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(t.c.id, t.c[source])
+            .where(t.c.id > last_id, t.c[source].is_not(None))
+            .order_by(t.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            statement, [{"_id": id, "_value": f(value)} for id, value in rows]
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column(
+                "plaid_metadata_json",
+                postgresql.JSONB(astext_type=sa.Text()),
+                nullable=True,
+            ),
+        )
+        convert(
+            table,
+            "plaid_metadata",
+            "plaid_metadata_json",
+            postgresql.JSONB(),
+            lambda value: parse_metadata(table, value),
+        )
+        op.drop_column(table, "plaid_metadata")
+        op.alter_column(table, "plaid_metadata_json", new_column_name="plaid_metadata")
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.add_column(
+            table, sa.Column("plaid_metadata_str", sa.String(), nullable=True)
+        )
+        convert(
+            table,
+            "plaid_metadata",
+            "plaid_metadata_str",
+            sa.String(),
+            pprint.pformat,
+        )
+        op.drop_column(table, "plaid_metadata")
+        op.alter_column(table, "plaid_metadata_str", new_column_name="plaid_metadata")
@@ -13,12 +13,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from datetime import datetime, timedelta, timezone
 from logging import getLogger
 from fastapi import APIRouter
-from fastapi import BackgroundTasks
+from app.crud.job import CRUDJob
 from app.database.deps import DBSession
 from app import handlers
-from app.schemas.webhook import WebhookReq
+from app.schemas.job import JobApiIn
+from app.schemas.webhook import SyncUpdatesAvailableWebhookReq, WebhookReq
+from app.settings import settings
 from app.utils import include_package_routes
 
 router = APIRouter()
@@ -27,16 +30,24 @@ logger = getLogger(__name__)
 
 
 @router.post("/webhook")
-def webhook(req: WebhookReq, background_tasks: BackgroundTasks, db: DBSession) -> None:
+def webhook(req: WebhookReq, db: DBSession) -> None:
     name = f"handle_{req.webhook_type.lower()}_{req.webhook_code.lower()}"
-    try:
-        handler = getattr(handlers, name)
-    except AttributeError:
+    if not hasattr(handlers, name):
         logger.error(
             "%s/%s currently not supported", req.webhook_type, req.webhook_code
         )
         return
-    background_tasks.add_task(handler, req)
+    # Persist the webhook before acknowledging it, app.worker processes it
+    job_in = JobApiIn(name=name, payload=req.model_dump(mode="json"))
+    run_at = None
+    if isinstance(req, SyncUpdatesAvailableWebhookReq):
+        # Bursts of updates for an item are coalesced into a single sync after a
+        # short delay. If one is already running, this queues one follow-up.
+        job_in.key = f"{name}:{req.item_id}"
+        run_at = datetime.now(timezone.utc) + timedelta(
+            seconds=settings.WEBHOOK_DEBOUNCE_SECONDS
+        )
+    CRUDJob.enqueue(db, job_in, run_at)
 
 
 include_package_routes(router, __name__, __path__)
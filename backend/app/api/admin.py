@@ -15,32 +15,45 @@
 
 
 from datetime import date
-from typing import Iterable
+from typing import Annotated, Iterable
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
 from pydantic import HttpUrl
-from sqlalchemy.exc import NoResultFound
 
 from app.crud.account import CRUDAccount, CRUDSyncableAccount
 from app.crud.institution import CRUDSyncableInstitution
+from app.crud.job import CRUDJob
 from app.crud.replacementpattern import CRUDReplacementPattern
 from app.crud.transaction import CRUDSyncableTransaction, CRUDTransaction
 from app.crud.user import CRUDUser
 from app.crud.userinstitutionlink import CRUDSyncableUserInstitutionLink
 from app.database.deps import DBSession
 from app.deps.user import CurrentSuperuser
+from app.exceptions.common import UnknownError
 from app.plaid.account import fetch_accounts
 from app.plaid.category import get_all_plaid_categories
+from app.plaid.common import read_client_stats
+from app.plaid.syncscheduler import enqueue_sync_all_user_institution_links
 from app.plaid.transaction import (
     reset_transaction_to_metadata as _reset_transaction_to_metadata,
+    reset_transactions_to_metadata,
 )
 from app.plaid.userinstitutionlink import (
     fetch_transactions,
     fetch_user_institution_link,
     update_item_webhook,
 )
+from app.schemas.exchangerate import ExchangeRateImportApiOut
+from app.schemas.job import JobApiOut, JobStatus
+from app.schemas.plaid import PlaidEndpointStatsApiOut
 from app.schemas.transaction import TransactionPlaidIn, TransactionPlaidOut
-from app.schemas.userinstitutionlink import UserInstitutionLinkPlaidOut
+from app.schemas.userinstitutionlink import (
+    MAX_SYNC_WORKERS,
+    ResetReportApiOut,
+    SyncManyReq,
+    UserInstitutionLinkPlaidOut,
+)
+from app.utils.exchangerate import import_rates, rates_cache
 
 router = APIRouter()
 
@@ -51,6 +64,45 @@ def accounts_update_balances(db: DBSession, me: CurrentSuperuser) -> None:
         CRUDAccount.update_balance(db, account.id)
 
 
+@router.get("/jobs")
+def read_jobs(
+    db: DBSession, me: CurrentSuperuser, status: JobStatus | None = None
+) -> Iterable[JobApiOut]:
+    return CRUDJob.read_many(db, status__eq=status, order_by="run_at__asc")
+
+
+@router.put("/jobs/{job_id}/retry")
+def retry_job(db: DBSession, me: CurrentSuperuser, job_id: int) -> JobApiOut:
+    return CRUDJob.retry(db, job_id)
+
+
+@router.get("/plaid/stats")
+def read_plaid_stats(me: CurrentSuperuser) -> list[PlaidEndpointStatsApiOut]:
+    # Latency of the Plaid calls made by this process since it started
+    return read_client_stats()
+
+
+@router.put("/exchange-rates/import")
+def import_exchange_rates(
+    db: DBSession,
+    me: CurrentSuperuser,
+    file: Annotated[UploadFile, File(...)],
+    base_currency: str = "USD",
+    replace: bool = False,
+    fill: bool = True,
+) -> ExchangeRateImportApiOut:
+    try:
+        report = import_rates(
+            db, file.file, file.filename or "", base_currency, replace, fill
+        )
+    except (ValueError, KeyError) as e:
+        raise UnknownError(e)
+    # Committed first, so that no other request caches the previous rates again
+    db.commit()
+    rates_cache.clear()
+    return report
+
+
 @router.put("/categories/sync")
 def cateogries_sync(db: DBSession, me: CurrentSuperuser) -> None:
     get_all_plaid_categories(db)
@@ -102,6 +154,18 @@ def update_webhook(db: DBSession, me: CurrentSuperuser, webhook_url: HttpUrl) ->
         update_item_webhook(uil.access_token, str(webhook_url))
 
 
+@router.put("/user-institution-links/sync")
+def sync_user_institution_links(
+    db: DBSession,
+    me: CurrentSuperuser,
+    workers: Annotated[int, Query(ge=1, le=MAX_SYNC_WORKERS)] = 4,
+    workers_per_user: Annotated[int, Query(ge=1, le=MAX_SYNC_WORKERS)] = 1,
+) -> JobApiOut | None:
+    # Enqueued for app.worker, None if a sync of every item is already pending
+    req = SyncManyReq(workers=workers, workers_per_user=workers_per_user)
+    return enqueue_sync_all_user_institution_links(db, req)
+
+
 @router.put("/user-institution-links/{user_institution_link_id}/resync")
 def resync_user_institution_link(
     db: DBSession, me: CurrentSuperuser, user_institution_link_id: int
@@ -150,18 +214,24 @@ def resync_transactions(
         )
     except HTTPException:
         replacement_pattern = None
-    for transaction_in in fetch_transactions(
-        db, user_institution_link, start_date, end_date, replacement_pattern
-    ):
-        try:
-            transaction_out = CRUDSyncableTransaction.read(
-                db, plaid_id=transaction_in.plaid_id
-            )
-        except NoResultFound:
+    transactions_in = list(
+        fetch_transactions(
+            db, user_institution_link, start_date, end_date, replacement_pattern
+        )
+    )
+    transactions_out = {
+        t.plaid_id: t
+        for t in CRUDSyncableTransaction.read_many(
+            db, plaid_id__in=[t.plaid_id for t in transactions_in]
+        )
+    }
+    for transaction_in in transactions_in:
+        if transaction_in.plaid_id not in transactions_out:
             print(
                 f"{transaction_in.plaid_id} not found: {transaction_in.timestamp} - {transaction_in.name} {transaction_in.amount}"
             )
             continue
+        transaction_out = transactions_out[transaction_in.plaid_id]
         transaction_out_dict = transaction_out.model_dump()
         if dry_run:
             for k, v in transaction_in.model_dump().items():
@@ -206,21 +276,23 @@ def read_many(
 @router.put("/user-institution-links/{user_institution_link_id}/reset-to-metadata")
 def reset_many_transactions_to_metadata(
     db: DBSession, me: CurrentSuperuser, user_institution_link_id: int
-) -> Iterable[TransactionPlaidOut]:
+) -> ResetReportApiOut:
+    user_institution_link = CRUDSyncableUserInstitutionLink.read(
+        db, id=user_institution_link_id
+    )
+    user = CRUDUser.read(db, id=user_institution_link.user_id)
     try:
         replacement_pattern = CRUDReplacementPattern.read(
             db, user_institution_link_id=user_institution_link_id
         )
     except HTTPException:
         replacement_pattern = None
-    for t in CRUDSyncableTransaction.read_many(
-        db, user_institution_link_id=user_institution_link_id
-    ):
-        yield _reset_transaction_to_metadata(db, t.id, replacement_pattern)
-    for a in CRUDSyncableAccount.read_many(
-        db, user_institution_link_id=user_institution_link_id
-    ):
-        CRUDAccount.update_balance(db, a.id)
+    return reset_transactions_to_metadata(
+        db,
+        user_institution_link_id,
+        replacement_pattern,
+        user.default_currency_code,
+    )
 
 
 @router.put(
@@ -18,15 +18,33 @@ from datetime import date
 from decimal import Decimal
 
 import requests
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
 
-from app.utils.exchangerate import get_exchange_rate
+from app.utils.exchangerate import get_exchange_rate, get_exchange_rates
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
 
+# A year of daily rates
+MAX_DATES = 366
+
+
+@router.get("/many")
+def read_exchange_rates(
+    from_currency: str, to_currency: str, dates: list[date] = Query()
+) -> dict[date, Decimal]:
+    if len(set(dates)) > MAX_DATES:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_DATES} dates"
+        )
+    try:
+        return get_exchange_rates(from_currency, to_currency, dates)
+    except requests.HTTPError as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.get("/")
 def read_exchange_rate(from_currency: str, to_currency: str, date: date) -> Decimal:
     try:
@@ -16,7 +16,15 @@
 import logging
 from typing import Annotated, Iterable
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Response,
+    UploadFile,
+    status,
+)
 
 from app.crud.account import CRUDAccount
 from app.crud.transaction import CRUDTransaction
@@ -25,6 +33,8 @@ from app.database.deps import DBSession
 from app.deps.user import CurrentUser
 from app.exceptions.common import UnknownError
 from app.schemas.transaction import (
+    NEXT_CURSOR_HEADER,
+    PREV_CURSOR_HEADER,
     TransactionApiIn,
     TransactionApiOut,
     TransactionQueryArg,
@@ -95,14 +105,20 @@ def read_many(
     db: DBSession,
     me: CurrentUser,
     account_id: int,
+    response: Response,
     kwargs: TransactionQueryArg = Depends(),
 ) -> Iterable[TransactionApiOut]:
-    return CRUDTransaction.read_many(
+    transactions, prev_cursor, next_cursor = CRUDTransaction.read_page(
         db,
         user_id=me.id,
         account_id=account_id,
         **kwargs.model_dump(exclude={"account_id__eq"}, exclude_none=True)
     )
+    if prev_cursor and next_cursor:
+        # Pass as before or after to read the neighbouring pages
+        response.headers[PREV_CURSOR_HEADER] = prev_cursor
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return transactions
 
 
 @router.put("/{transaction_id}")
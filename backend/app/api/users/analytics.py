@@ -14,18 +14,31 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from datetime import date
-from typing import Iterable, Literal
+from typing import Annotated, Iterable, Literal
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, status
 
+from app.crud.account import CRUDAccount
+from app.crud.balancecheckpoint import CRUDBalanceCheckpoint
+from app.crud.networth import CRUDNetWorth, Granularity
 from app.crud.plstatement import CRUDPLStatement
 from app.database.deps import DBSession
 from app.deps.user import CurrentUser
+from app.schemas.account import AccountBalanceApiOut, NetWorthApiOut
+from app.schemas.common import CurrencyCode
 from app.schemas.transactiongroup import DetailedPLStatementApiOut, PLStatementApiOut
+from app.schemas.user import UserApiOut
 
 router = APIRouter()
 
 
+def get_report_currency_code(
+    me: UserApiOut, currency_code: CurrencyCode | None
+) -> CurrencyCode | None:
+    # Stored amounts are already in the default currency
+    return None if currency_code == me.default_currency_code else currency_code
+
+
 @router.get("/detailed/{timestamp__ge}/{timestamp__lt}")
 def get_detailed_pl_statement(
     db: DBSession,
@@ -33,6 +46,7 @@ def get_detailed_pl_statement(
     timestamp__ge: date,
     timestamp__lt: date,
     bucket_id: int | None = None,
+    currency_code: CurrencyCode | None = None,
 ) -> DetailedPLStatementApiOut:
     return CRUDPLStatement.get_detailed_pl_statement(
         db,
@@ -40,6 +54,7 @@ def get_detailed_pl_statement(
         timestamp__ge=timestamp__ge,
         timestamp__lt=timestamp__lt,
         bucket_id=bucket_id,
+        currency_code=get_report_currency_code(me, currency_code),
     )
 
 
@@ -51,6 +66,7 @@ def get_many_pl_statements(
     bucket_id: int | None = None,
     page: int = 0,
     per_page: int = 12,
+    currency_code: CurrencyCode | None = None,
 ) -> Iterable[PLStatementApiOut]:
     return CRUDPLStatement.get_many_pl_statements(
         db,
@@ -59,4 +75,40 @@ def get_many_pl_statements(
         aggregate_by=aggregate_by,
         page=page,
         per_page=per_page,
+        currency_code=get_report_currency_code(me, currency_code),
+    )
+
+
+@router.get("/balances")
+def get_many_balances(
+    db: DBSession,
+    me: CurrentUser,
+    timestamps: Annotated[list[date], Query()],
+    account_ids: Annotated[list[int], Query()] = [],
+) -> Iterable[AccountBalanceApiOut]:
+    user_account_ids = [a.id for a in CRUDAccount.read_many(db, user_id=me.id)]
+    if not account_ids:
+        account_ids = user_account_ids
+    elif not set(account_ids) <= set(user_account_ids):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="account not found")
+    return CRUDBalanceCheckpoint.get_balances(db, account_ids, timestamps)
+
+
+@router.get("/net-worth")
+def get_net_worth(
+    db: DBSession,
+    me: CurrentUser,
+    granularity: Granularity = "monthly",
+    timestamp__ge: date | None = None,
+    timestamp__lt: date | None = None,
+    max_points: Annotated[int | None, Query(ge=3)] = None,
+) -> NetWorthApiOut:
+    return CRUDNetWorth.get_net_worth(
+        db,
+        user_id=me.id,
+        default_currency_code=me.default_currency_code,
+        granularity=granularity,
+        timestamp__ge=timestamp__ge,
+        timestamp__lt=timestamp__lt,
+        max_points=max_points,
     )
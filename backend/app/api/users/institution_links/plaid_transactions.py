@@ -50,7 +50,8 @@ def sync(db: DBSession, me: CurrentUser, user_institution_link_id: int) -> None:
             replacement_pattern_out,
             me.default_currency_code,
         )
-    except urllib3.exceptions.ReadTimeoutError:
+    except (urllib3.exceptions.TimeoutError, urllib3.exceptions.MaxRetryError):
+        # Connect timeouts surface as MaxRetryError once urllib3 gave up
         raise HTTPException(status.HTTP_504_GATEWAY_TIMEOUT)
     except plaid.ApiException as e:
         error_code = json.loads(e.body).get("error_code")
@@ -17,14 +17,19 @@ import logging
 from decimal import Decimal
 from typing import Iterable
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 
 from app.crud.consolidatedtransaction import CRUDConsolidatedTransaction
 from app.crud.transaction import CRUDTransaction
 from app.crud.transactiongroup import CRUDTransactionGroup
 from app.database.deps import DBSession
 from app.deps.user import CurrentUser
-from app.schemas.transaction import TransactionApiOut, TransactionQueryArg
+from app.schemas.transaction import (
+    NEXT_CURSOR_HEADER,
+    PREV_CURSOR_HEADER,
+    TransactionApiOut,
+    TransactionQueryArg,
+)
 from app.schemas.transactiongroup import TransactionGroupApiIn, TransactionGroupApiOut
 
 logger = logging.getLogger(__name__)
@@ -35,15 +40,21 @@ router = APIRouter()
 def read_many(
     db: DBSession,
     me: CurrentUser,
+    response: Response,
     consolidate: bool = False,
     arg: TransactionQueryArg = Depends(),
 ) -> Iterable[TransactionApiOut | TransactionGroupApiOut]:
-    return CRUDConsolidatedTransaction.read_many(
+    transactions, prev_cursor, next_cursor = CRUDConsolidatedTransaction.read_page(
         db,
         user_id=me.id,
         consolidate=consolidate,
         **arg.model_dump(exclude_none=True),
     )
+    if prev_cursor and next_cursor:
+        # Pass as before or after to read the neighbouring pages
+        response.headers[PREV_CURSOR_HEADER] = prev_cursor
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return transactions
 
 
 @router.post("/")
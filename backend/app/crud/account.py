@@ -17,7 +17,7 @@ from datetime import date
 from decimal import Decimal
 from typing import Any, Generic, Iterable, Type
 
-from sqlalchemy import Select
+from sqlalchemy import Select, select
 from sqlalchemy.orm import Session
 
 from app.crud.common import (
@@ -37,6 +37,7 @@ from app.models.account import (
     PersonalLedger,
     Property,
 )
+from app.models.transaction import Transaction
 from app.models.userinstitutionlink import UserInstitutionLink
 from app.schemas.account import (
     AccountApiOut,
@@ -70,7 +71,11 @@ from app.schemas.transaction import (
     TransactionApiOut,
     TransactionPlaidIn,
 )
-from app.utils.exchangerate import get_exchange_rate
+from app.utils.exchangerate import (
+    get_exchange_rate,
+    get_exchange_rates,
+    store_usd_rates,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -111,8 +116,9 @@ class __CRUDAccountBase(
 
     @classmethod
     def create(cls, db: Session, obj_in: InSchemaT, **kwargs: Any) -> OutSchemaT:
+        values = obj_in.model_dump()
         obj = cls.__in_schemas__[type(obj_in)].create(
-            db, **obj_in.model_dump(), **kwargs
+            db, **values, current_balance=values["initial_balance"], **kwargs
         )
         return cls.model_validate(obj)
 
@@ -142,25 +148,22 @@ class __CRUDAccountBase(
         transactions: list[TransactionApiIn],
         default_currency_code: CurrencyCode,
     ) -> Iterable[TransactionApiOut]:
-        min_timestamp = None
         account_out = CRUDAccount.read(db, id=account_id)
-        for transaction_in in transactions:
-            if min_timestamp:
-                min_timestamp = min(transaction_in.timestamp, min_timestamp)
-            else:
-                min_timestamp = transaction_in.timestamp
-            yield CRUDTransaction.create(
-                db,
-                transaction_in,
-                account_id=account_id,
-                account_balance=Decimal(0),
-                exchange_rate=get_exchange_rate(
-                    account_out.currency_code,
-                    default_currency_code,
-                    transaction_in.timestamp,
-                ),
-            )
-        CRUDAccount.update_balance(db, account_id, min_timestamp)
+        exchange_rates = get_exchange_rates(
+            account_out.currency_code,
+            default_currency_code,
+            (t.timestamp for t in transactions),
+        )
+        with CRUDTransaction.defer_account_balances(db):
+            for transaction_in in transactions:
+                transaction_out = CRUDTransaction.create(
+                    db,
+                    transaction_in,
+                    account_id=account_id,
+                    account_balance=Decimal(0),
+                    exchange_rate=exchange_rates[transaction_in.timestamp],
+                )
+                yield cls.insert_balance(db, transaction_out)
 
     @classmethod
     def create_transaction_plaid(
@@ -182,8 +185,7 @@ class __CRUDAccountBase(
                 transaction_in.timestamp,
             ),
         )
-        CRUDAccount.update_balance(db, account_id, transaction_in.timestamp)
-        return transaction_out
+        return cls.insert_balance(db, transaction_out)
 
     @classmethod
     def create_transaction(
@@ -207,8 +209,7 @@ class __CRUDAccountBase(
                 transaction_in.timestamp,
             ),
         )
-        cls.update_balance(db, account_id, transaction_in.timestamp)
-        return transaction_out
+        return cls.insert_balance(db, transaction_out)
 
     @classmethod
     def update_transaction(
@@ -221,12 +222,13 @@ class __CRUDAccountBase(
         transaction_group_id: int | None = None,
     ) -> TransactionApiOut:
         account_out = CRUDAccount.read(db, id=account_id)
+        prev_transaction_out = CRUDTransaction.read(db, id=transaction_id)
         transaction_out = CRUDTransaction.update(
             db,
             transaction_id,
             transaction_in,
             account_id=account_id,
-            account_balance=Decimal(0),
+            account_balance=prev_transaction_out.account_balance,
             exchange_rate=get_exchange_rate(
                 account_out.currency_code,
                 default_currency_code,
@@ -234,18 +236,77 @@ class __CRUDAccountBase(
             ),
             transaction_group_id=transaction_group_id,
         )
-        CRUDAccount.update_balance(db, account_id, transaction_in.timestamp)
-        return transaction_out
+        if (
+            prev_transaction_out.account_id == account_id
+            and prev_transaction_out.timestamp == transaction_in.timestamp
+        ):
+            # Same position in the account: shift it and everything after it
+            CRUDTransaction.shift_account_balances(
+                db,
+                account_id,
+                transaction_in.timestamp,
+                transaction_id,
+                transaction_in.amount - prev_transaction_out.amount,
+                include_self=True,
+            )
+        else:
+            # The transaction moved: recompute from its earliest position
+            if prev_transaction_out.account_id != account_id:
+                cls.update_balance(
+                    db, prev_transaction_out.account_id, prev_transaction_out.timestamp
+                )
+            cls.update_balance(
+                db,
+                account_id,
+                min(prev_transaction_out.timestamp, transaction_in.timestamp),
+            )
+        return CRUDTransaction.read(db, id=transaction_id)
+
+    @classmethod
+    def insert_balance(
+        cls, db: Session, transaction_out: TransactionApiOut
+    ) -> TransactionApiOut:
+        # Delta-shift mode for a newly inserted transaction: set its balance from
+        # the previous one and move every later transaction by its amount.
+        if CRUDTransaction.are_account_balances_deferred(db):
+            CRUDTransaction.update_account_balances(
+                db, transaction_out.account_id, transaction_out.timestamp
+            )
+            return transaction_out
+        transaction = Transaction.read(db, id__eq=transaction_out.id)
+        transaction.account_balance = (
+            CRUDTransaction.get_previous_account_balance(
+                db, transaction.account_id, transaction.timestamp, transaction.id
+            )
+            + transaction.amount
+        )
+        CRUDTransaction.shift_account_balances(
+            db,
+            transaction.account_id,
+            transaction.timestamp,
+            transaction.id,
+            transaction.amount,
+        )
+        return CRUDTransaction.model_validate(transaction)
 
     @classmethod
     def update_transactions_amount_default_currency(
         cls, db: Session, account_id: int, default_currency_code: CurrencyCode
     ) -> None:
         account = Account.read(db, id__eq=account_id)
-        for transaction in db.scalars(account.transactions.select()).yield_per(50):
-            transaction.exchange_rate = get_exchange_rate(
-                account.currency_code, default_currency_code, transaction.timestamp
+        if account.currency_code != default_currency_code:
+            # Store the rates of the days missing before joining them
+            store_usd_rates(
+                db,
+                select(Transaction.timestamp).where(
+                    Transaction.account_id == account_id
+                ),
             )
+        CRUDTransaction.update_amounts_default_currency(
+            db, account_id, account.currency_code, default_currency_code
+        )
+        # Loaded transactions would otherwise keep their former amounts
+        db.expire_all()
 
 
 class CRUDAccount(__CRUDAccountBase[AccountApiOut, AccountApiIn]):
@@ -0,0 +1,164 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from datetime import date
+from decimal import Decimal
+from typing import Iterable
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import (
+    Date,
+    Integer,
+    cast,
+    column,
+    delete,
+    desc,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    true,
+    update,
+    values,
+)
+from sqlalchemy.orm import Session
+
+from app.models.account import Account
+from app.models.balancecheckpoint import BalanceCheckpoint
+from app.models.transaction import Transaction
+from app.schemas.account import AccountBalanceApiOut
+
+logger = logging.getLogger(__name__)
+
+
+class CRUDBalanceCheckpoint:
+    @classmethod
+    def refresh(
+        cls,
+        db: Session,
+        account_id: int,
+        timestamp__ge: date | None = None,
+        timestamp__lt: date | None = None,
+    ) -> None:
+        # Rebuild the month-end checkpoints of the months in the given range from
+        # the balance of the last transaction of each month
+        where = [BalanceCheckpoint.account_id == account_id]
+        transactions_where = [Transaction.account_id == account_id]
+        if timestamp__ge:
+            where.append(BalanceCheckpoint.timestamp >= timestamp__ge)
+            transactions_where.append(Transaction.timestamp >= timestamp__ge)
+        if timestamp__lt:
+            where.append(BalanceCheckpoint.timestamp < timestamp__lt)
+            transactions_where.append(Transaction.timestamp < timestamp__lt)
+        db.execute(
+            delete(BalanceCheckpoint).where(*where),
+            execution_options={"synchronize_session": False},
+        )
+
+        month_end = cast(
+            func.date_trunc("month", Transaction.timestamp)
+            + literal_column("INTERVAL '1 month - 1 day'"),
+            Date,
+        )
+        checkpoints = (
+            select(Transaction.account_id, month_end, Transaction.account_balance)
+            .distinct(month_end)
+            .where(*transactions_where)
+            .order_by(month_end, desc(Transaction.timestamp), desc(Transaction.id))
+        )
+        db.execute(
+            insert(BalanceCheckpoint).from_select(
+                ["account_id", "timestamp", "balance"], checkpoints
+            )
+        )
+
+    @classmethod
+    def update(cls, db: Session, account_id: int, timestamp: date | None) -> None:
+        # Balances changed from timestamp onwards: rebuild from its month
+        cls.refresh(db, account_id, timestamp.replace(day=1) if timestamp else None)
+
+    @classmethod
+    def shift(
+        cls, db: Session, account_id: int, timestamp: date, delta: Decimal
+    ) -> None:
+        # Balances after timestamp moved by delta: shift the checkpoints of the
+        # following months and rebuild the one of its month, which may be new
+        month = timestamp.replace(day=1)
+        next_month = month + relativedelta(months=1)
+        statement = (
+            update(BalanceCheckpoint)
+            .where(
+                BalanceCheckpoint.account_id == account_id,
+                BalanceCheckpoint.timestamp >= next_month,
+            )
+            .values(balance=BalanceCheckpoint.balance + delta)
+        )
+        db.execute(statement, execution_options={"synchronize_session": False})
+        cls.refresh(db, account_id, month, next_month)
+
+    @classmethod
+    def get_balances(
+        cls, db: Session, account_ids: list[int], timestamps: list[date]
+    ) -> Iterable[AccountBalanceApiOut]:
+        # Balance at the end of each day for every account: the latest month-end
+        # checkpoint on or before the day plus the amounts since then
+        if not account_ids or not timestamps:
+            return
+        points = values(
+            column("account_id", Integer), column("timestamp", Date), name="points"
+        ).data([(a, t) for a in account_ids for t in timestamps])
+
+        checkpoint = (
+            select(BalanceCheckpoint.timestamp, BalanceCheckpoint.balance)
+            .where(
+                BalanceCheckpoint.account_id == points.c.account_id,
+                BalanceCheckpoint.timestamp <= points.c.timestamp,
+            )
+            .order_by(desc(BalanceCheckpoint.timestamp))
+            .limit(1)
+            .lateral("checkpoint")
+        )
+        residual = (
+            select(func.coalesce(func.sum(Transaction.amount), 0))
+            .where(
+                Transaction.account_id == points.c.account_id,
+                Transaction.timestamp <= points.c.timestamp,
+                or_(
+                    checkpoint.c.timestamp.is_(None),
+                    Transaction.timestamp > checkpoint.c.timestamp,
+                ),
+            )
+            .scalar_subquery()
+        )
+        balance = func.coalesce(checkpoint.c.balance, Account.initial_balance)
+        statement = (
+            select(
+                points.c.account_id,
+                points.c.timestamp,
+                (balance + residual).label("balance"),
+            )
+            .select_from(points)
+            .join(Account, Account.id == points.c.account_id)
+            .outerjoin(checkpoint, true())
+            .order_by(points.c.account_id, points.c.timestamp)
+        )
+        for result in db.execute(statement):
+            yield AccountBalanceApiOut(
+                account_id=result.account_id,
+                timestamp=result.timestamp,
+                balance=result.balance,
+            )
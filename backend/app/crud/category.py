@@ -15,6 +15,9 @@
 
 from typing import Generic
 
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
 from app.crud.common import CRUDBase, InSchemaT, OutSchemaT
 from app.models.category import Category
 from app.schemas.category import (
@@ -40,3 +43,26 @@ class CRUDCategory(
 
 class CRUDSyncableCategory(__CRUDCategoryBase[CategoryPlaidOut, CategoryPlaidIn]):
     __out_schema__ = CategoryPlaidOut
+
+    @classmethod
+    def read_plaid_ids(cls, db: Session) -> dict[str, int]:
+        # Plaid primary category to id, without loading the icons
+        statement = select(Category.plaid_id, Category.id).where(
+            Category.plaid_id.is_not(None)
+        )
+        return {plaid_id: id for plaid_id, id in db.execute(statement)}
+
+    @classmethod
+    def update_icon(cls, db: Session, id: int, icon: bytes) -> None:
+        Category.update(db, id, icon=icon)
+
+    @classmethod
+    def read_missing_icons(cls, db: Session) -> dict[int, tuple[str, str | None]]:
+        # Plaid primary and icon URL of the synced categories without an icon
+        icon_url = Category.plaid_metadata["personal_finance_category_icon_url"]
+        statement = select(Category.id, Category.plaid_id, icon_url.astext).where(
+            Category.plaid_id.is_not(None), Category.icon == b""
+        )
+        return {
+            id: (plaid_id, icon_url) for id, plaid_id, icon_url in db.execute(statement)
+        }
@@ -21,7 +21,7 @@ from sqlalchemy import Select
 from sqlalchemy.exc import NoResultFound, IntegrityError
 from sqlalchemy.orm import Session
 
-from app.models.common import Base
+from app.models.common import Base, get_cursor, is_reversed
 from app.schemas.common import ApiOutMixin, ApiInMixin
 
 ModelT = TypeVar("ModelT", bound=Base)
@@ -70,9 +70,31 @@ class CRUDBase(Generic[ModelT, OutSchemaT, InSchemaT]):
     @classmethod
     def read_many(cls, db: Session, **kwargs: Any) -> Iterable[OutSchemaT]:
         statement = cls.select(**kwargs)
-        for s in db.scalars(statement).all():
+        objs = db.scalars(statement).all()
+        if is_reversed(kwargs.get("after"), kwargs.get("before")):
+            objs = objs[::-1]
+        for s in objs:
             yield cls.model_validate(s)
 
+    @classmethod
+    def read_page(
+        cls, db: Session, order_by: str | None = None, **kwargs: Any
+    ) -> tuple[list[OutSchemaT], str | None, str | None]:
+        # The objects with the cursors before the first and after the last,
+        # ordered by id unless ordered otherwise
+        order_by = order_by or "id__asc"
+        statement = cls.select(order_by=order_by, **kwargs)
+        objs = db.scalars(statement).all()
+        if not objs:
+            return [], None, None
+        if is_reversed(kwargs.get("after"), kwargs.get("before")):
+            objs = objs[::-1]
+        return (
+            [cls.model_validate(s) for s in objs],
+            get_cursor(objs[0], order_by),
+            get_cursor(objs[-1], order_by),
+        )
+
     @classmethod
     def update(
         cls, db: Session, id: int, obj_in: InSchemaT, **kwargs: Any
@@ -16,16 +16,22 @@
 
 import itertools
 import logging
+from datetime import date
 from typing import Any, Iterable
 
-from sqlalchemy import Row, Select, func, select, case
+from sqlalchemy import Row, Select, and_, func, select, case
 from sqlalchemy.orm import Session
 
+from app.crud.exchangerate import CRUDExchangeRate
+from app.exceptions.exchangerate import ExchangeRateNotFound
 from app.models.account import Account, NonInstitutionalAccount
 from app.models.common import (
     CalculatedColumnsMeta,
+    get_cursor,
+    get_cursor_expressions,
     get_order_by_expressions,
     get_where_expressions,
+    is_reversed,
 )
 from app.models.transaction import Transaction
 from app.models.transactiongroup import TransactionGroup
@@ -33,6 +39,7 @@ from app.models.userinstitutionlink import UserInstitutionLink
 from app.schemas.transaction import TransactionApiOut
 from app.schemas.transactiongroup import TransactionGroupApiOut
 from app.utils.common import get_search_expressions
+from app.utils.exchangerate import store_usd_rates
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +62,53 @@ class ConsolidatedTransaction(metaclass=CalculatedColumnsMeta):
 
 
 class CRUDConsolidatedTransaction:
+    @classmethod
+    def select_days(
+        cls,
+        user_id: int | None,
+        timestamp__ge: date | None = None,
+        timestamp__lt: date | None = None,
+    ) -> Select[tuple[str, date]]:
+        # Distinct (currency_code, timestamp) of the transactions of the user in
+        # the period, and of the later ones of groups that may start in it
+        statement = (
+            select(Account.currency_code, Transaction.timestamp)
+            .join(Account)
+            .outerjoin(UserInstitutionLink)
+            .where(
+                (NonInstitutionalAccount.user_id == user_id)
+                | (UserInstitutionLink.user_id == user_id)
+            )
+            .distinct()
+        )
+        if timestamp__ge:
+            statement = statement.where(Transaction.timestamp >= timestamp__ge)
+        if timestamp__lt:
+            statement = statement.where(
+                (Transaction.timestamp < timestamp__lt)
+                | Transaction.transaction_group_id.is_not(None)
+            )
+        return statement
+
+    @classmethod
+    def store_rates(
+        cls,
+        db: Session,
+        user_id: int,
+        currency_code: str,
+        timestamp__ge: date | None = None,
+        timestamp__lt: date | None = None,
+    ) -> None:
+        # Stores the rates the conversion to currency_code joins, raising if a
+        # day would still have none rather than leave it out of the sums
+        days = cls.select_days(user_id, timestamp__ge, timestamp__lt).subquery()
+        store_usd_rates(
+            db, select(days.c.timestamp).where(days.c.currency_code != currency_code)
+        )
+        missing = CRUDExchangeRate.read_missing_rate(db, days, currency_code)
+        if missing:
+            raise ExchangeRateNotFound(missing)
+
     @classmethod
     def select(
         cls,
@@ -66,13 +120,35 @@ class CRUDConsolidatedTransaction:
         page: int = 0,
         order_by: str | None = None,
         bucket_id: int | None = None,
+        currency_code: str | None = None,
+        after: str | None = None,
+        before: str | None = None,
         **kwargs: Any,
     ) -> Select[tuple[Any, ...]]:
         model = ConsolidatedTransaction if consolidate else Transaction
+        if not order_by and (per_page or after or before):
+            # Pages and their cursors follow ids unless ordered otherwise
+            order_by = "id__asc"
 
         exprs = get_where_expressions(model, **kwargs)
         if search:
             exprs = itertools.chain(get_search_expressions(search, model.name))
+        exprs = itertools.chain(
+            exprs, get_cursor_expressions(model, order_by, after, before)
+        )
+
+        amount_default_currency = model.amount_default_currency
+        if currency_code:
+            # Converted at query time with the stored rate of each transaction day,
+            # rounded as the stored amounts are
+            days = cls.select_days(
+                user_id, kwargs.get("timestamp__ge"), kwargs.get("timestamp__lt")
+            )
+            rates = CRUDExchangeRate.select_rates(days.subquery(), currency_code)
+            amount_converted = func.round(Transaction.amount * rates.c.rate, 2)
+            amount_default_currency = (
+                func.sum(amount_converted) if consolidate else amount_converted
+            ).label("amount_default_currency")
 
         # SELECT
         statement = select(
@@ -80,7 +156,7 @@ class CRUDConsolidatedTransaction:
             model.name,
             model.category_id,
             model.transaction_group_id,
-            model.amount_default_currency,
+            amount_default_currency,
             model.timestamp,
             model.amount,
             model.account_id,
@@ -98,6 +174,14 @@ class CRUDConsolidatedTransaction:
             statement = statement.outerjoin(TransactionGroup)
         statement = statement.join(Account)
         statement = statement.outerjoin(UserInstitutionLink)
+        if currency_code:
+            statement = statement.outerjoin(
+                rates,
+                and_(
+                    rates.c.currency_code == Account.currency_code,
+                    rates.c.timestamp == Transaction.timestamp,
+                ),
+            )
 
         # WHERE
         statement = statement.where(
@@ -124,13 +208,16 @@ class CRUDConsolidatedTransaction:
 
         # ORDER BY
         if order_by:
-            order_exprs = get_order_by_expressions(model, order_by)
+            order_exprs = get_order_by_expressions(
+                model, order_by, is_reversed(after, before)
+            )
             statement = statement.order_by(*order_exprs)
 
         # OFFSET and LIMIT
         if per_page:
-            offset = page * per_page
-            statement = statement.offset(offset).limit(per_page)
+            if not (after or before):
+                statement = statement.offset(page * per_page)
+            statement = statement.limit(per_page)
 
         return statement
 
@@ -171,9 +258,33 @@ class CRUDConsolidatedTransaction:
     def read_many(
         cls, db: Session, **kwargs: Any
     ) -> Iterable[TransactionApiOut | TransactionGroupApiOut]:
-        for transaction in db.execute(cls.select(**kwargs)):
+        transactions = db.execute(cls.select(**kwargs)).all()
+        if is_reversed(kwargs.get("after"), kwargs.get("before")):
+            transactions = transactions[::-1]
+        for transaction in transactions:
             yield cls.model_validate(transaction)
 
+    @classmethod
+    def read_page(
+        cls, db: Session, order_by: str | None = None, **kwargs: Any
+    ) -> tuple[
+        list[TransactionApiOut | TransactionGroupApiOut], str | None, str | None
+    ]:
+        # The transactions with the cursors before the first and after the last,
+        # from the rows as selected: groups are keyed by their negated id. They
+        # are ordered by id unless ordered otherwise
+        order_by = order_by or "id__asc"
+        transactions = db.execute(cls.select(order_by=order_by, **kwargs)).all()
+        if not transactions:
+            return [], None, None
+        if is_reversed(kwargs.get("after"), kwargs.get("before")):
+            transactions = transactions[::-1]
+        return (
+            [cls.model_validate(t) for t in transactions],
+            get_cursor(transactions[0], order_by),
+            get_cursor(transactions[-1], order_by),
+        )
+
     @classmethod
     def read(
         cls, db: Session, **kwargs: Any
@@ -0,0 +1,157 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, Mapping
+
+from sqlalchemy import (
+    CTE,
+    ScalarSelect,
+    Select,
+    SQLColumnExpression,
+    Subquery,
+    case,
+    desc,
+    exists,
+    select,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.exchangerate import ExchangeRate
+
+logger = logging.getLogger(__name__)
+
+
+class CRUDExchangeRate:
+    @classmethod
+    def select_rate(
+        cls,
+        currency_code: SQLColumnExpression[str] | str,
+        timestamp: SQLColumnExpression[date] | date,
+    ) -> ScalarSelect[Decimal]:
+        # Rate per US dollar of the latest day stored on or before timestamp, as
+        # the offline lookups, correlated to the columns given
+        return (
+            select(ExchangeRate.rate)
+            .where(
+                ExchangeRate.currency_code == currency_code,
+                ExchangeRate.timestamp <= timestamp,
+            )
+            .order_by(desc(ExchangeRate.timestamp))
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    @classmethod
+    def select_rates(cls, days: Subquery, currency_code: str) -> CTE:
+        # Rate from the currency of each (currency_code, timestamp) row of days
+        # to currency_code, resolved once per row to be joined by many
+        rate = case(
+            (days.c.currency_code == currency_code, 1),
+            else_=cls.select_rate(currency_code, days.c.timestamp)
+            / cls.select_rate(days.c.currency_code, days.c.timestamp),
+        )
+        return (
+            select(days.c.currency_code, days.c.timestamp, rate.label("rate"))
+            .cte("rates")
+            .prefix_with("MATERIALIZED")
+        )
+
+    @classmethod
+    def read_missing_rate(
+        cls, db: Session, days: Subquery, currency_code: str
+    ) -> date | None:
+        # A day of days that no rate stored on or before converts
+        rates = cls.select_rates(days, currency_code)
+        statement = select(rates.c.timestamp).where(rates.c.rate.is_(None)).limit(1)
+        return db.scalar(statement)
+
+    @classmethod
+    def read_missing_timestamps(
+        cls, db: Session, timestamps: Select[tuple[date]]
+    ) -> list[date]:
+        # Days of timestamps without any rate stored
+        days = timestamps.distinct().subquery()
+        timestamp = days.c[0]
+        statement = select(timestamp).where(
+            ~exists().where(ExchangeRate.timestamp == timestamp)
+        )
+        return list(db.scalars(statement))
+
+    @classmethod
+    def read_rates(
+        cls, db: Session, timestamps: Iterable[date]
+    ) -> dict[date, dict[str, Decimal]]:
+        # Rates of every currency per US dollar on each day, absent if not stored
+        statement = select(
+            ExchangeRate.timestamp, ExchangeRate.currency_code, ExchangeRate.rate
+        ).where(ExchangeRate.timestamp.in_(list(timestamps)))
+        rates: dict[date, dict[str, Decimal]] = {}
+        for timestamp, currency_code, rate in db.execute(statement):
+            rates.setdefault(timestamp, {})[currency_code] = rate
+        return rates
+
+    @classmethod
+    def read_previous_rates(
+        cls, db: Session, timestamp: date
+    ) -> tuple[date, dict[str, Decimal]] | None:
+        # Rates of the latest day stored on or before timestamp
+        previous = (
+            select(ExchangeRate.timestamp)
+            .where(ExchangeRate.timestamp <= timestamp)
+            .order_by(desc(ExchangeRate.timestamp))
+            .limit(1)
+            .scalar_subquery()
+        )
+        statement = select(
+            ExchangeRate.timestamp, ExchangeRate.currency_code, ExchangeRate.rate
+        ).where(ExchangeRate.timestamp == previous)
+        rates: dict[str, Decimal] = {}
+        previous_timestamp = None
+        for previous_timestamp, currency_code, rate in db.execute(statement):
+            rates[currency_code] = rate
+        return (previous_timestamp, rates) if previous_timestamp else None
+
+    @classmethod
+    def create_rates(
+        cls,
+        db: Session,
+        rates: Mapping[date, Mapping[str, Decimal]],
+        replace: bool = False,
+    ) -> int:
+        # Fetched rates are immutable once published, so concurrent inserts keep
+        # the first. Imported ones replace what is stored when asked to
+        values = [
+            {"timestamp": timestamp, "currency_code": currency_code, "rate": rate}
+            for timestamp, day_rates in rates.items()
+            for currency_code, rate in day_rates.items()
+        ]
+        if not values:
+            return 0
+        statement = insert(ExchangeRate)
+        if replace:
+            statement = statement.on_conflict_do_update(
+                index_elements=["timestamp", "currency_code"],
+                set_={"rate": statement.excluded.rate},
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(
+                index_elements=["timestamp", "currency_code"]
+            )
+        db.execute(statement, values)
+        return len(values)
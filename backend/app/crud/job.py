@@ -0,0 +1,196 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, delete, exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+
+from app.crud.common import CRUDBase
+from app.exceptions.job import JobNotDead
+from app.models.job import Job
+from app.schemas.job import JobApiIn, JobApiOut
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CRUDJob(CRUDBase[Job, JobApiOut, JobApiIn]):
+    __model__ = Job
+    __out_schema__ = JobApiOut
+
+    @classmethod
+    def lock_key(cls, db: Session, key: str) -> None:
+        # Serializes, until commit, the transactions that make a job with key
+        # pending, as the unique index on pending keys would fail all but one
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(key))))
+
+    @classmethod
+    def enqueue(
+        cls, db: Session, job_in: JobApiIn, run_at: datetime | None = None
+    ) -> JobApiOut | None:
+        # A keyed job is dropped if one with the same key is already pending,
+        # which keeps its payload and run_at. Returns None if it was dropped.
+        now = datetime.now(timezone.utc)
+        if not job_in.key:
+            return cls.create(
+                db,
+                job_in,
+                status="pending",
+                attempts=0,
+                run_at=run_at or now,
+                created=now,
+            )
+        cls.lock_key(db, job_in.key)
+        statement = (
+            insert(Job)
+            .values(
+                **job_in.model_dump(),
+                status="pending",
+                attempts=0,
+                run_at=run_at or now,
+                created=now,
+            )
+            .on_conflict_do_nothing(
+                index_elements=[Job.key], index_where=Job.status == "pending"
+            )
+            .returning(Job)
+        )
+        job = db.scalars(statement).one_or_none()
+        if not job:
+            logger.info("Coalesced job %s", job_in.key)
+            return None
+        return cls.model_validate(job)
+
+    @classmethod
+    def read_pending_duplicate(cls, db: Session, id: int) -> JobApiOut | None:
+        # Another pending job with the same key as the given one
+        other = aliased(Job)
+        statement = (
+            select(other)
+            .join(Job, (Job.id == id) & (other.key == Job.key))
+            .where(other.id != id, other.status == "pending")
+        )
+        job = db.scalars(statement).one_or_none()
+        return cls.model_validate(job) if job else None
+
+    @classmethod
+    def claim(cls, db: Session) -> JobApiOut | None:
+        # Lock the next due job, skipping those claimed by other workers and
+        # those whose key is already running, and mark it as running. The
+        # caller must commit to release the row lock.
+        running = aliased(Job)
+        statement = (
+            select(Job)
+            .where(
+                Job.status == "pending",
+                Job.run_at <= func.now(),
+                ~exists().where(running.key == Job.key, running.status == "running"),
+            )
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = db.scalars(statement).first()
+        if not job:
+            return None
+        job.status = "running"
+        job.attempts += 1
+        job.locked_at = datetime.now(timezone.utc)
+        db.flush()
+        return cls.model_validate(job)
+
+    @classmethod
+    def ack(cls, db: Session, id: int) -> None:
+        db.execute(delete(Job).where(Job.id == id))
+
+    @classmethod
+    def fail(cls, db: Session, id: int, error: str, retry: bool = True) -> JobApiOut:
+        # Retry with exponential backoff until the attempts are exhausted, then
+        # leave the job as dead for inspection.
+        job = Job.read(db, id__eq=id)
+        if job.key:
+            cls.lock_key(db, job.key)
+        job.last_error = error
+        job.locked_at = None
+        if retry and (duplicate_out := cls.read_pending_duplicate(db, id)):
+            # A follow-up is already queued and will redo the work
+            logger.info("Job %s superseded by job %s", id, duplicate_out.id)
+            db.delete(job)
+            return duplicate_out
+        if retry and job.attempts < settings.JOB_MAX_ATTEMPTS:
+            delay = min(
+                settings.JOB_RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1),
+                settings.JOB_RETRY_MAX_DELAY_SECONDS,
+            )
+            job.status = "pending"
+            job.run_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        else:
+            job.status = "dead"
+        db.flush()
+        return cls.model_validate(job)
+
+    @classmethod
+    def recover(cls, db: Session) -> int:
+        # Release jobs left running by a worker that died, counting the lost run
+        # as a failed attempt.
+        timeout = timedelta(seconds=settings.JOB_TIMEOUT_SECONDS)
+        stale = (Job.status == "running") & (Job.locked_at < func.now() - timeout)
+        # Locked in order, so that two recoveries cannot deadlock
+        db.execute(
+            select(func.pg_advisory_xact_lock(func.hashtext(Job.key)))
+            .where(stale, Job.key.is_not(None))
+            .order_by(Job.key)
+        )
+        pending = aliased(Job)
+        db.execute(
+            delete(Job).where(
+                stale,
+                exists().where(pending.key == Job.key, pending.status == "pending"),
+            )
+        )
+        result = db.execute(
+            update(Job)
+            .where(stale)
+            .values(
+                status=case(
+                    (Job.attempts >= settings.JOB_MAX_ATTEMPTS, "dead"),
+                    else_="pending",
+                ),
+                locked_at=None,
+                last_error="Timed out",
+            )
+        )
+        if result.rowcount:
+            logger.warning("Recovered %s stale jobs", result.rowcount)
+        return result.rowcount
+
+    @classmethod
+    def retry(cls, db: Session, id: int) -> JobApiOut:
+        job = Job.read(db, id__eq=id)
+        if job.status != "dead":
+            raise JobNotDead()
+        if job.key:
+            cls.lock_key(db, job.key)
+        if duplicate_out := cls.read_pending_duplicate(db, id):
+            db.delete(job)
+            return duplicate_out
+        job.status = "pending"
+        job.attempts = 0
+        job.run_at = datetime.now(timezone.utc)
+        db.flush()
+        return cls.model_validate(job)
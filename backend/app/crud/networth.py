@@ -0,0 +1,214 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Literal
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import Date, Select, case, cast, desc, func, select
+from sqlalchemy.orm import Session
+
+from app.crud.account import CRUDAccount
+from app.crud.exchangerate import CRUDExchangeRate
+from app.exceptions.exchangerate import ExchangeRateNotFound
+from app.models.account import Account
+from app.models.transaction import Transaction
+from app.schemas.account import BalancePointApiOut, NetWorthApiOut
+from app.schemas.common import CurrencyCode
+from app.utils.downsampling import largest_triangle_three_buckets
+from app.utils.exchangerate import get_exchange_rate, store_usd_rates
+
+logger = logging.getLogger(__name__)
+
+Granularity = Literal["yearly", "quarterly", "monthly", "weekly", "daily"]
+
+DATE_TRUNC_FIELDS: dict[Granularity, str] = {
+    "yearly": "year",
+    "quarterly": "quarter",
+    "monthly": "month",
+    "weekly": "week",
+    "daily": "day",
+}
+
+PERIOD_LENGTHS: dict[Granularity, relativedelta] = {
+    "yearly": relativedelta(years=1),
+    "quarterly": relativedelta(months=3),
+    "monthly": relativedelta(months=1),
+    "weekly": relativedelta(weeks=1),
+    "daily": relativedelta(days=1),
+}
+
+TWO_PLACES = Decimal(10) ** -2
+
+
+def truncate(timestamp: date, granularity: Granularity) -> date:
+    match granularity:
+        case "yearly":
+            return date(timestamp.year, 1, 1)
+        case "quarterly":
+            return date(timestamp.year, 3 * ((timestamp.month - 1) // 3) + 1, 1)
+        case "monthly":
+            return timestamp.replace(day=1)
+        case "weekly":
+            return timestamp - timedelta(days=timestamp.weekday())
+        case _:
+            return timestamp
+
+
+def downsample(
+    points: list[BalancePointApiOut], max_points: int | None
+) -> list[BalancePointApiOut]:
+    if not max_points:
+        return points
+    indices = largest_triangle_three_buckets(
+        [p.timestamp.toordinal() for p in points],
+        [float(p.balance) for p in points],
+        max_points,
+    )
+    return [points[i] for i in indices]
+
+
+class CRUDNetWorth:
+    @classmethod
+    def select_period_balances(
+        cls,
+        account_ids: list[int],
+        granularity: Granularity,
+        timestamp__lt: date,
+        currency_code: str,
+    ) -> Select[Any]:
+        # Last balance of every account in every period with transactions, along
+        # with the stored exchange rate to currency_code on the day of the last
+        # transaction, as the offline lookups
+        period = cast(
+            func.date_trunc(DATE_TRUNC_FIELDS[granularity], Transaction.timestamp),
+            Date,
+        ).label("period")
+        balances = (
+            select(
+                Transaction.account_id,
+                period,
+                Transaction.account_balance,
+                Transaction.timestamp,
+                func.row_number()
+                .over(
+                    partition_by=(Transaction.account_id, period),
+                    order_by=(desc(Transaction.timestamp), desc(Transaction.id)),
+                )
+                .label("row_number"),
+            )
+            .where(
+                Transaction.account_id.in_(account_ids),
+                Transaction.timestamp < timestamp__lt,
+            )
+            .subquery()
+        )
+        exchange_rate = case(
+            (Account.currency_code == currency_code, 1),
+            else_=CRUDExchangeRate.select_rate(currency_code, balances.c.timestamp)
+            / CRUDExchangeRate.select_rate(Account.currency_code, balances.c.timestamp),
+        )
+        return (
+            select(
+                balances.c.account_id,
+                balances.c.period,
+                balances.c.account_balance,
+                balances.c.timestamp,
+                exchange_rate.label("exchange_rate"),
+            )
+            .join(Account, Account.id == balances.c.account_id)
+            .where(balances.c.row_number == 1)
+        )
+
+    @classmethod
+    def get_net_worth(
+        cls,
+        db: Session,
+        user_id: int,
+        default_currency_code: CurrencyCode,
+        granularity: Granularity,
+        timestamp__ge: date | None = None,
+        timestamp__lt: date | None = None,
+        max_points: int | None = None,
+    ) -> NetWorthApiOut:
+        accounts = {a.id: a for a in CRUDAccount.read_many(db, user_id=user_id)}
+        timestamp__lt = timestamp__lt or date.today() + timedelta(days=1)
+
+        statement = cls.select_period_balances(
+            list(accounts), granularity, timestamp__lt, default_currency_code
+        )
+        days = statement.where(
+            Account.currency_code != default_currency_code
+        ).subquery()
+        store_usd_rates(db, select(days.c.timestamp))
+        by_period: dict[date, list[Any]] = defaultdict(list)
+        for result in db.execute(statement):
+            if result.exchange_rate is None:
+                raise ExchangeRateNotFound(result.timestamp)
+            by_period[result.period].append(result)
+
+        end = truncate(timestamp__lt - timedelta(days=1), granularity)
+        if timestamp__ge:
+            start = truncate(timestamp__ge, granularity)
+        else:
+            start = min(by_period, default=end)
+
+        # Carry every balance forward through the periods without transactions,
+        # starting from the initial balance of each account. Balances are
+        # converted with the latest known rate of the account, or the earliest
+        # one before its first transaction.
+        balances = {id: a.initial_balance for id, a in accounts.items()}
+        exchange_rates: dict[int, Decimal] = {}
+        for period in sorted(by_period, reverse=True):
+            for result in by_period[period]:
+                exchange_rates[result.account_id] = result.exchange_rate
+        for id, account in accounts.items():
+            if account.currency_code == default_currency_code:
+                exchange_rates[id] = Decimal(1)
+            elif id not in exchange_rates:
+                exchange_rates[id] = get_exchange_rate(
+                    account.currency_code, default_currency_code, date.today()
+                )
+
+        total: list[BalancePointApiOut] = []
+        series: dict[int, list[BalancePointApiOut]] = {id: [] for id in accounts}
+        period = min(start, min(by_period, default=start))
+        while period <= end:
+            for result in by_period.get(period, []):
+                balances[result.account_id] = result.account_balance
+                exchange_rates[result.account_id] = result.exchange_rate
+            if period >= start:
+                period_end = min(
+                    period + PERIOD_LENGTHS[granularity], timestamp__lt
+                ) - timedelta(days=1)
+                net_worth = Decimal(0)
+                for id in accounts:
+                    balance = (balances[id] * exchange_rates[id]).quantize(TWO_PLACES)
+                    series[id].append(
+                        BalancePointApiOut(timestamp=period_end, balance=balance)
+                    )
+                    net_worth += balance
+                total.append(
+                    BalancePointApiOut(timestamp=period_end, balance=net_worth)
+                )
+            period += PERIOD_LENGTHS[granularity]
+
+        return NetWorthApiOut(
+            total=downsample(total, max_points),
+            accounts={id: downsample(s, max_points) for id, s in series.items()},
+        )
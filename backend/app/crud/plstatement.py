@@ -149,14 +149,47 @@ class CRUDPLStatement:
 
         return detailed_pl_statement_query
 
+    @classmethod
+    def get_period(
+        cls,
+        result: Any,
+        aggregate_by: Literal["yearly", "quarterly", "monthly", "weekly", "daily"],
+    ) -> tuple[date, date]:
+        year = int(result.year)
+
+        match aggregate_by:
+            case "quarterly":
+                quarter = int(result.quarter)
+                timestamp__ge = date(year, 1 + 3 * (quarter - 1), 1)
+                timestamp__lt = timestamp__ge + relativedelta(months=3)
+            case "monthly":
+                month = int(result.month)
+                timestamp__ge = date(year, month, 1)
+                timestamp__lt = timestamp__ge + relativedelta(months=1)
+            case "weekly":
+                week = int(result.week)
+                timestamp__ge = date.fromisocalendar(year, week, 1)
+                timestamp__lt = timestamp__ge + relativedelta(weeks=1)
+            case "daily":
+                month = int(result.month)
+                day = int(result.day)
+                timestamp__ge = date(year, month, day)
+                timestamp__lt = timestamp__ge + relativedelta(days=1)
+            case _:
+                timestamp__ge = date(year, 1, 1)
+                timestamp__lt = timestamp__ge + relativedelta(years=1)
+
+        return timestamp__ge, timestamp__lt
+
     @classmethod
     def get_many_pl_statements(
         cls,
         db: Session,
         aggregate_by: Literal["yearly", "quarterly", "monthly", "weekly", "daily"],
+        user_id: int,
+        currency_code: str | None = None,
         **kwargs: Any,
     ) -> Iterable[PLStatementApiOut]:
-
         group_by = ["year"]
         match aggregate_by:
             case "quarterly":
@@ -170,50 +203,62 @@ class CRUDPLStatement:
         order_by = [f"{c}__desc" for c in group_by]
 
         statement = cls.select_pl_statements(
-            group_by=group_by, order_by=order_by, **kwargs
+            user_id=user_id, group_by=group_by, order_by=order_by, **kwargs
         )
+        results = db.execute(statement).all()
+
+        if currency_code and results:
+            # Converts only the periods of the page, which are contiguous
+            timestamp__ge = cls.get_period(results[-1], aggregate_by)[0]
+            timestamp__lt = cls.get_period(results[0], aggregate_by)[1]
+            CRUDConsolidatedTransaction.store_rates(
+                db, user_id, currency_code, timestamp__ge, timestamp__lt
+            )
+            statement = cls.select_pl_statements(
+                user_id=user_id,
+                group_by=group_by,
+                order_by=order_by,
+                currency_code=currency_code,
+                **{
+                    **kwargs,
+                    "timestamp__ge": timestamp__ge,
+                    "timestamp__lt": timestamp__lt,
+                    "page": 0,
+                    "per_page": 0,
+                },
+            )
+            results = db.execute(statement).all()
 
-        for result in db.execute(statement):
-            expenses = result.expenses
-            income = result.income
-
-            year = int(result.year)
-
-            match aggregate_by:
-                case "quarterly":
-                    quarter = int(result.quarter)
-                    timestamp__ge = date(year, 1 + 3 * (quarter - 1), 1)
-                    timestamp__lt = timestamp__ge + relativedelta(months=3)
-                case "monthly":
-                    month = int(result.month)
-                    timestamp__ge = date(year, month, 1)
-                    timestamp__lt = timestamp__ge + relativedelta(months=1)
-                case "weekly":
-                    week = int(result.week)
-                    timestamp__ge = date.fromisocalendar(year, week, 1)
-                    timestamp__lt = timestamp__ge + relativedelta(weeks=1)
-                case "daily":
-                    month = int(result.month)
-                    day = int(result.day)
-                    timestamp__ge = date(year, month, day)
-                    timestamp__lt = timestamp__ge + relativedelta(days=1)
-                case _:
-                    timestamp__ge = date(year, 1, 1)
-                    timestamp__lt = timestamp__ge + relativedelta(years=1)
+        for result in results:
+            timestamp__ge, timestamp__lt = cls.get_period(result, aggregate_by)
 
             yield PLStatementApiOut(
                 timestamp__ge=timestamp__ge,
                 timestamp__lt=timestamp__lt,
-                expenses=expenses,
-                income=income,
+                expenses=result.expenses,
+                income=result.income,
             )
 
     @classmethod
     def get_detailed_pl_statement(
-        cls, db: Session, timestamp__ge: date, timestamp__lt: date, **kwargs: Any
+        cls,
+        db: Session,
+        timestamp__ge: date,
+        timestamp__lt: date,
+        user_id: int,
+        currency_code: str | None = None,
+        **kwargs: Any,
     ) -> DetailedPLStatementApiOut:
+        if currency_code:
+            CRUDConsolidatedTransaction.store_rates(
+                db, user_id, currency_code, timestamp__ge, timestamp__lt
+            )
         statement = cls.select_detailed_pl_statement(
-            timestamp__ge=timestamp__ge, timestamp__lt=timestamp__lt, **kwargs
+            timestamp__ge=timestamp__ge,
+            timestamp__lt=timestamp__lt,
+            user_id=user_id,
+            currency_code=currency_code,
+            **kwargs,
         )
         by_category: dict[int, dict[int, Decimal]] = defaultdict(
             lambda: defaultdict(Decimal)
@@ -14,17 +14,38 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from contextlib import contextmanager
 from datetime import date
-from typing import Any, Generic
+from decimal import Decimal
+from typing import Any, Generic, Iterator
 
 from fastapi import HTTPException, status
-from sqlalchemy import Select
+from sqlalchemy import (
+    Select,
+    String,
+    any_,
+    bindparam,
+    delete,
+    desc,
+    event,
+    func,
+    literal,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
+from app.crud.balancecheckpoint import CRUDBalanceCheckpoint
 from app.crud.common import CRUDBase, InSchemaT, OutSchemaT
-from app.models.account import Account, NonInstitutionalAccount
+from app.crud.exchangerate import CRUDExchangeRate
+from app.exceptions.exchangerate import ExchangeRateNotFound
+from app.models.account import Account, InstitutionalAccount, NonInstitutionalAccount
+from app.models.file import File
 from app.models.transaction import Transaction
+from app.models.transactiongroup import TransactionGroup
 from app.models.userinstitutionlink import UserInstitutionLink
 from app.schemas.transaction import (
     TransactionApiOut,
@@ -35,6 +56,8 @@ from app.schemas.transaction import (
 
 logger = logging.getLogger(__name__)
 
+DEFERRED_ACCOUNT_BALANCES = "deferred_account_balances"
+
 
 class __CRUDTransactionBase(
     Generic[OutSchemaT, InSchemaT], CRUDBase[Transaction, OutSchemaT, InSchemaT]
@@ -42,8 +65,19 @@ class __CRUDTransactionBase(
     __model__ = Transaction
 
     @classmethod
-    def select(cls, user_id: int = 0, **kwargs: Any) -> Select[tuple[Transaction]]:
+    def select(
+        cls, user_id: int = 0, user_institution_link_id: int = 0, **kwargs: Any
+    ) -> Select[tuple[Transaction]]:
         statement = super().select(**kwargs)
+        if user_institution_link_id:
+            statement = statement.where(
+                Transaction.account_id.in_(
+                    select(InstitutionalAccount.id).where(
+                        InstitutionalAccount.user_institution_link_id
+                        == user_institution_link_id
+                    )
+                )
+            )
         if user_id:
             statement = statement.join(Account)
             statement = statement.outerjoin(UserInstitutionLink)
@@ -84,28 +118,196 @@ class __CRUDTransactionBase(
     def update_account_balances(
         cls, db: Session, id: int, timestamp: date | None = None
     ) -> None:
-        account = Account.read(db, id__eq=id)
+        # Recompute the running balance of every transaction of the account
+        # from timestamp onwards in a single UPDATE ... FROM statement, taking
+        # the balance right before timestamp (or the initial balance) as base.
+        deferred = db.info.get(DEFERRED_ACCOUNT_BALANCES)
+        if deferred is not None:
+            if id in deferred and (not timestamp or not deferred[id]):
+                deferred[id] = None
+            elif id in deferred:
+                deferred[id] = min(deferred[id], timestamp)
+            else:
+                deferred[id] = timestamp
+            return
 
+        base: Any = (
+            select(Account.initial_balance).where(Account.id == id).scalar_subquery()
+        )
+        where = [Transaction.account_id == id]
         if timestamp:
-            statement = Transaction.select(
-                account_id__eq=id, timestamp__lt=timestamp, order_by="timestamp__desc"
+            prev_balance = (
+                select(Transaction.account_balance)
+                .where(Transaction.account_id == id, Transaction.timestamp < timestamp)
+                .order_by(desc(Transaction.timestamp), desc(Transaction.id))
+                .limit(1)
+                .scalar_subquery()
             )
-            prev_transaction = db.scalars(statement).first()
-            if prev_transaction:
-                prev_balance = prev_transaction.account_balance
-            else:
-                prev_balance = account.initial_balance
-            statement = Transaction.select(
-                account_id__eq=id, timestamp__ge=timestamp, order_by="timestamp__asc"
+            base = func.coalesce(prev_balance, base)
+            where.append(Transaction.timestamp >= timestamp)
+
+        running_sum = func.sum(Transaction.amount).over(
+            order_by=(Transaction.timestamp, Transaction.id)
+        )
+        balances = (
+            select(Transaction.id, (base + running_sum).label("account_balance"))
+            .where(*where)
+            .subquery()
+        )
+        statement = (
+            update(Transaction)
+            .where(
+                Transaction.id == balances.c.id,
+                Transaction.account_balance.is_distinct_from(
+                    balances.c.account_balance
+                ),
+            )
+            .values(account_balance=balances.c.account_balance)
+        )
+        db.execute(statement, execution_options={"synchronize_session": "fetch"})
+
+        # Keep the stored current balance in step with the last transaction
+        last_balance = (
+            select(Transaction.account_balance)
+            .where(Transaction.account_id == id)
+            .order_by(desc(Transaction.timestamp), desc(Transaction.id))
+            .limit(1)
+            .scalar_subquery()
+        )
+        statement = (
+            update(Account)
+            .where(Account.id == id)
+            .values(
+                current_balance=func.coalesce(last_balance, Account.initial_balance)
+            )
+        )
+        db.execute(statement, execution_options={"synchronize_session": "fetch"})
+        CRUDBalanceCheckpoint.update(db, id, timestamp)
+
+    @classmethod
+    def update_amounts_default_currency(
+        cls,
+        db: Session,
+        account_id: int,
+        currency_code: str,
+        default_currency_code: str,
+    ) -> None:
+        # Convert every amount of the account with a single UPDATE ... FROM the
+        # rate of each of its distinct days, joined from the exchange_rate table
+        if currency_code == default_currency_code:
+            statement = (
+                update(Transaction)
+                .where(Transaction.account_id == account_id)
+                .values(amount_default_currency=Transaction.amount)
+            )
+            db.execute(statement, execution_options={"synchronize_session": False})
+            return
+        days = (
+            select(literal(currency_code).label("currency_code"), Transaction.timestamp)
+            .where(Transaction.account_id == account_id)
+            .distinct()
+            .subquery()
+        )
+        missing = CRUDExchangeRate.read_missing_rate(db, days, default_currency_code)
+        if missing:
+            raise ExchangeRateNotFound(missing)
+        rates = CRUDExchangeRate.select_rates(days, default_currency_code)
+        statement = (
+            update(Transaction)
+            .where(
+                Transaction.account_id == account_id,
+                Transaction.timestamp == rates.c.timestamp,
             )
+            .values(
+                amount_default_currency=func.round(Transaction.amount * rates.c.rate, 2)
+            )
+        )
+        db.execute(statement, execution_options={"synchronize_session": False})
+
+    @classmethod
+    def shift_account_balances(
+        cls,
+        db: Session,
+        id: int,
+        timestamp: date,
+        transaction_id: int,
+        delta: Decimal,
+        include_self: bool = False,
+    ) -> None:
+        # Delta-shift mode for single inserts, updates and deletes: every
+        # transaction ordered after (timestamp, transaction_id) moves by delta.
+        if cls.are_account_balances_deferred(db):
+            cls.update_account_balances(db, id, timestamp)
+            return
+
+        position = tuple_(Transaction.timestamp, Transaction.id)
+        if include_self:
+            where = position >= (timestamp, transaction_id)
         else:
-            statement = Transaction.select(account_id__eq=id, order_by="timestamp__asc")
-            prev_balance = account.initial_balance
+            where = position > (timestamp, transaction_id)
+        statement = (
+            update(Transaction)
+            .where(Transaction.account_id == id, where)
+            .values(account_balance=Transaction.account_balance + delta)
+        )
+        db.execute(statement, execution_options={"synchronize_session": "fetch"})
+        statement = (
+            update(Account)
+            .where(Account.id == id)
+            .values(current_balance=Account.current_balance + delta)
+        )
+        db.execute(statement, execution_options={"synchronize_session": "fetch"})
+        CRUDBalanceCheckpoint.shift(db, id, timestamp, delta)
 
-        for transaction in db.scalars(statement).yield_per(50):
-            account_balance = prev_balance + transaction.amount
-            Transaction.update(db, transaction.id, account_balance=account_balance)
-            prev_balance = transaction.account_balance
+    @classmethod
+    def are_account_balances_deferred(cls, db: Session) -> bool:
+        return DEFERRED_ACCOUNT_BALANCES in db.info
+
+    @classmethod
+    @contextmanager
+    def defer_account_balances(cls, db: Session) -> Iterator[None]:
+        # Unit of work for balances: within the block only the earliest dirty
+        # timestamp of every account is recorded, and each account is
+        # recomputed once on exit or when the session commits.
+        if cls.are_account_balances_deferred(db):
+            yield
+            return
+        db.info[DEFERRED_ACCOUNT_BALANCES] = {}
+        try:
+            yield
+            cls.flush_account_balances(db)
+        finally:
+            db.info.pop(DEFERRED_ACCOUNT_BALANCES, None)
+
+    @classmethod
+    def flush_account_balances(cls, db: Session) -> None:
+        deferred = db.info.pop(DEFERRED_ACCOUNT_BALANCES, None)
+        if deferred is None:
+            return
+        try:
+            for account_id, timestamp in deferred.items():
+                cls.update_account_balances(db, account_id, timestamp)
+        finally:
+            db.info[DEFERRED_ACCOUNT_BALANCES] = {}
+
+    @classmethod
+    def get_previous_account_balance(
+        cls, db: Session, id: int, timestamp: date, transaction_id: int
+    ) -> Decimal:
+        statement = (
+            select(Transaction.account_balance)
+            .where(
+                Transaction.account_id == id,
+                tuple_(Transaction.timestamp, Transaction.id)
+                < (timestamp, transaction_id),
+            )
+            .order_by(desc(Transaction.timestamp), desc(Transaction.id))
+            .limit(1)
+        )
+        prev_balance = db.scalars(statement).first()
+        if prev_balance is None:
+            return Account.read(db, id__eq=id).initial_balance
+        return prev_balance
 
     @classmethod
     def delete(cls, db: Session, id: int) -> int:
@@ -113,7 +315,8 @@ class __CRUDTransactionBase(
 
         # Store values from the transaction being deleted
         timestamp = transaction.timestamp
-        account = transaction.account
+        account_id = transaction.account_id
+        amount = transaction.amount
         transaction_group = transaction.transaction_group
 
         # Delete group if it's going to have only 1 transaction left
@@ -124,11 +327,106 @@ class __CRUDTransactionBase(
         # Delete transaction from DB
         super().delete(db, id)
 
-        # Update account balances in account's transactions from that point
-        cls.update_account_balances(db, account.id, timestamp)
+        # Shift account balances in account's transactions after that point
+        cls.shift_account_balances(db, account_id, timestamp, id, -amount)
 
         return id
 
+    @classmethod
+    def upsert_many(cls, db: Session, values: list[dict[str, Any]]) -> None:
+        # Write a page of synced transactions with multi-row INSERT ... ON
+        # CONFLICT (plaid_id) DO UPDATE statements: the rows are passed as
+        # parameters, so that the statement is compiled once and sent in
+        # batches. Balances are recomputed once per account from the earliest
+        # old or new position.
+        if not values:
+            return
+        values = list({v["plaid_id"]: v for v in values}.values())
+        transaction_group_ids = set()
+        with cls.defer_account_balances(db):
+            previous = select(Transaction.account_id, Transaction.timestamp).where(
+                Transaction.plaid_id.in_([v["plaid_id"] for v in values])
+            )
+            for account_id, timestamp in db.execute(previous):
+                cls.update_account_balances(db, account_id, timestamp)
+
+            upsert = insert(Transaction)
+            statement = upsert.on_conflict_do_update(
+                index_elements=[Transaction.plaid_id],
+                set_={
+                    key: upsert.excluded[key]
+                    for key in values[0]
+                    if key not in ("plaid_id", "account_balance")
+                },
+            ).returning(
+                Transaction.account_id,
+                Transaction.timestamp,
+                Transaction.transaction_group_id,
+            )
+            for account_id, timestamp, transaction_group_id in db.execute(
+                statement, values
+            ):
+                cls.update_account_balances(db, account_id, timestamp)
+                if transaction_group_id:
+                    transaction_group_ids.add(transaction_group_id)
+
+        for transaction_group_id in transaction_group_ids:
+            TransactionGroup.update(db, transaction_group_id)
+
+    @classmethod
+    def delete_many(cls, db: Session, plaid_ids: list[str]) -> None:
+        # Delete a page of removed synced transactions with a single
+        # DELETE ... WHERE plaid_id = ANY(...), along with their files and any
+        # group left with a single transaction
+        if not plaid_ids:
+            return
+        where = Transaction.plaid_id == any_(
+            bindparam("plaid_ids", plaid_ids, type_=ARRAY(String))
+        )
+        db.execute(
+            delete(File).where(
+                File.transaction_id.in_(select(Transaction.id).where(where))
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        statement = (
+            delete(Transaction)
+            .where(where)
+            .returning(
+                Transaction.account_id,
+                Transaction.timestamp,
+                Transaction.transaction_group_id,
+            )
+        )
+        transaction_group_ids = set()
+        with cls.defer_account_balances(db):
+            for account_id, timestamp, transaction_group_id in db.execute(
+                statement, execution_options={"synchronize_session": False}
+            ):
+                cls.update_account_balances(db, account_id, timestamp)
+                if transaction_group_id:
+                    transaction_group_ids.add(transaction_group_id)
+
+        if not transaction_group_ids:
+            return
+        remaining_groups = (
+            select(Transaction.transaction_group_id)
+            .where(Transaction.transaction_group_id.in_(transaction_group_ids))
+            .group_by(Transaction.transaction_group_id)
+            .having(func.count(Transaction.id) > 1)
+        )
+        orphan_group_ids = transaction_group_ids - set(db.scalars(remaining_groups))
+        if not orphan_group_ids:
+            return
+        ungroup = (
+            update(Transaction)
+            .where(Transaction.transaction_group_id.in_(orphan_group_ids))
+            .values(transaction_group_id=None)
+        )
+        db.execute(ungroup, execution_options={"synchronize_session": "fetch"})
+        for transaction_group_id in orphan_group_ids:
+            TransactionGroup.delete(db, transaction_group_id)
+
 
 class CRUDTransaction(__CRUDTransactionBase[TransactionApiOut, TransactionApiIn]):
     __out_schema__ = TransactionApiOut
@@ -138,3 +436,14 @@ class CRUDSyncableTransaction(
     __CRUDTransactionBase[TransactionPlaidOut, TransactionPlaidIn],
 ):
     __out_schema__ = TransactionPlaidOut
+
+
+@event.listens_for(Session, "before_commit")
+def flush_deferred_account_balances(session: Session) -> None:
+    CRUDTransaction.flush_account_balances(session)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_deferred_account_balances(session: Session, previous: Any) -> None:
+    if deferred := session.info.get(DEFERRED_ACCOUNT_BALANCES):
+        deferred.clear()
@@ -13,9 +13,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import logging
+from typing import Any
 
 from sqlalchemy.orm import Session
 
+from app.crud.account import CRUDAccount
 from app.crud.common import CRUDBase
 from app.models.user import User
 from app.schemas.user import UserApiOut, UserApiIn
@@ -30,3 +32,16 @@ class CRUDUser(CRUDBase[User, UserApiOut, UserApiIn]):
     @classmethod
     def authenticate(cls, db: Session, email: str, password: str) -> UserApiOut:
         return UserApiOut.model_validate(User.authenticate(db, email, password))
+
+    @classmethod
+    def update(
+        cls, db: Session, id: int, obj_in: UserApiIn, **kwargs: Any
+    ) -> UserApiOut:
+        prev_user_out = cls.read(db, id=id)
+        user_out = super().update(db, id, obj_in, **kwargs)
+        if user_out.default_currency_code != prev_user_out.default_currency_code:
+            for account_out in list(CRUDAccount.read_many(db, user_id=id)):
+                CRUDAccount.update_transactions_amount_default_currency(
+                    db, account_out.id, user_out.default_currency_code
+                )
+        return user_out
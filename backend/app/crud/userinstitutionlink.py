@@ -13,11 +13,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from typing import Any, Generic
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Generic, Iterator
 
-from sqlalchemy import Select
+from sqlalchemy import Select, func, select, update
+from sqlalchemy.orm import Session
 
 from app.crud.common import CRUDBase, InSchemaT, OutSchemaT
+from app.exceptions.userinstitutionlink import SyncInProgress
 from app.models.user import User
 from app.models.userinstitutionlink import (
     UserInstitutionLink,
@@ -28,6 +33,12 @@ from app.schemas.userinstitutionlink import (
     UserInstitutionLinkPlaidIn,
     UserInstitutionLinkPlaidOut,
 )
+from app.settings import settings
+
+# First keys of the advisory locks taken on user institution links, the second
+# one being the link id
+SYNC_LOCK_KEY = 1
+SYNC_PAGE_LOCK_KEY = 2
 
 
 class __CRUDUserInstitutionLinkBase(
@@ -45,6 +56,88 @@ class __CRUDUserInstitutionLinkBase(
             statement = statement.where(User.id == user_id)
         return statement
 
+    @classmethod
+    @contextmanager
+    def lock(cls, db: Session, id: int) -> Iterator[None]:
+        # Session-level advisory lock, held across commits as long as db is
+        # bound to a single connection. Raises SyncInProgress if already held.
+        if not db.scalar(select(func.pg_try_advisory_lock(SYNC_LOCK_KEY, id))):
+            raise SyncInProgress()
+        try:
+            yield
+        finally:
+            db.rollback()
+            db.scalar(select(func.pg_advisory_unlock(SYNC_LOCK_KEY, id)))
+            db.commit()
+
+    @classmethod
+    def lock_cursor(cls, db: Session, id: int) -> str | None:
+        # Transaction-level advisory lock serialising the writes of a sync page
+        # with its cursor, released on commit. Returns the committed cursor.
+        db.scalar(select(func.pg_advisory_xact_lock(SYNC_PAGE_LOCK_KEY, id)))
+        return db.scalar(
+            select(UserInstitutionLink.cursor).where(UserInstitutionLink.id == id)
+        )
+
+    @classmethod
+    def update_cursor(cls, db: Session, id: int, cursor: str | None) -> None:
+        db.execute(
+            update(UserInstitutionLink)
+            .where(UserInstitutionLink.id == id)
+            .values(cursor=cursor)
+        )
+
+    @classmethod
+    def claim_due(cls, db: Session, limit: int) -> list[OutSchemaT]:
+        # Lock the synced items whose next sync is due, skipping those claimed
+        # by another scheduler, and push it back by a full interval in case
+        # their sync never reports back. The caller must commit.
+        statement = (
+            select(UserInstitutionLink)
+            .where(
+                UserInstitutionLink.plaid_id != None,
+                UserInstitutionLink.next_sync_at <= func.now(),
+            )
+            .order_by(UserInstitutionLink.next_sync_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        user_institution_links = db.scalars(statement).all()
+        now = datetime.now(timezone.utc)
+        for user_institution_link in user_institution_links:
+            user_institution_link.next_sync_at = now + cls.__sync_delay()
+        db.flush()
+        return [cls.model_validate(u) for u in user_institution_links]
+
+    @classmethod
+    def update_sync_state(cls, db: Session, id: int, succeeded: bool) -> None:
+        # Schedule the next periodic sync. After a failure, the delay doubles
+        # with every failure in a row, whether the item ever synced or not.
+        user_institution_link = UserInstitutionLink.read(db, id__eq=id)
+        now = datetime.now(timezone.utc)
+        delay = cls.__sync_delay()
+        if succeeded:
+            user_institution_link.last_synced_at = now
+            user_institution_link.sync_failures = 0
+        else:
+            user_institution_link.sync_failures += 1
+            # The exponent is capped, past the maximum backoff anyway
+            exponent = min(user_institution_link.sync_failures, 16)
+            delay = min(
+                delay * 2**exponent,
+                timedelta(seconds=settings.SYNC_MAX_BACKOFF_SECONDS),
+            )
+        user_institution_link.next_sync_at = now + delay
+        db.flush()
+
+    @classmethod
+    def __sync_delay(cls) -> timedelta:
+        # Jitter spreads the syncs of items linked or synced at the same time
+        return timedelta(
+            seconds=settings.SYNC_INTERVAL_SECONDS
+            + random.uniform(0, settings.SYNC_JITTER_SECONDS)
+        )
+
 
 class CRUDUserInstitutionLink(
     __CRUDUserInstitutionLinkBase[UserInstitutionLinkApiOut, UserInstitutionLinkApiIn],
@@ -18,9 +18,12 @@ from app.models.common import Base  # noqa
 
 # 2. Import inheritors of the base model
 from app.models.account import Account
+from app.models.balancecheckpoint import BalanceCheckpoint
 from app.models.bucket import Bucket
 from app.models.category import Category
+from app.models.exchangerate import ExchangeRate
 from app.models.institution import Institution
+from app.models.job import Job
 from app.models.merchant import Merchant
 from app.models.replacementpattern import ReplacementPattern
 from app.models.transaction import Transaction
@@ -39,8 +42,11 @@ __all__ = [
     "Institution",
     "UserInstitutionLink",
     "Account",
+    "BalanceCheckpoint",
     "TransactionGroup",
     "Transaction",
     "Merchant",
     "Category",
+    "Job",
+    "ExchangeRate",
 ]
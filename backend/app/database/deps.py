@@ -25,6 +25,8 @@ from app.settings import settings
 engine = create_engine(
     str(settings.DATABASE_URL),
     pool_pre_ping=True,
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
     # echo="debug",
     # echo=True,
     # query_cache_size=0,
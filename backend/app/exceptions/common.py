@@ -29,3 +29,8 @@ class ObjectNotFoundError(HTTPException):
             super().__init__(status.HTTP_404_NOT_FOUND, f"{name} {id} not found")
         else:
             super().__init__(status.HTTP_404_NOT_FOUND, f"{name} not found")
+
+
+class InvalidCursorError(HTTPException):
+    def __init__(self, cursor: str) -> None:
+        super().__init__(status.HTTP_400_BAD_REQUEST, f"invalid cursor {cursor}")
@@ -22,3 +22,17 @@ class SyncedEntity(HTTPException):
         super().__init__(
             status.HTTP_403_FORBIDDEN, "User institution link is automatically synced"
         )
+
+
+class ItemLoginRequired(HTTPException):
+    def __init__(self) -> None:
+        super().__init__(
+            status.HTTP_403_FORBIDDEN, "User institution link requires a new login"
+        )
+
+
+class SyncInProgress(HTTPException):
+    def __init__(self) -> None:
+        super().__init__(
+            status.HTTP_409_CONFLICT, "User institution link is already being synced"
+        )
@@ -14,82 +14,66 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from functools import wraps
 from logging import getLogger
-from typing import Any, Callable, TypeVar
+from typing import Any
 
-from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import NoResultFound
 
-from app.crud.replacementpattern import CRUDReplacementPattern
-from app.crud.user import CRUDUser
 from app.crud.userinstitutionlink import CRUDSyncableUserInstitutionLink
-from app.database.deps import get_db
-from app.plaid.userinstitutionlink import sync_transactions
+from app.exceptions.userinstitutionlink import ItemLoginRequired
+from app.plaid.category import fetch_category_icons
+from app.plaid.syncscheduler import (
+    sync_all_user_institution_links,
+    sync_user_institution_link,
+)
+from app.schemas.userinstitutionlink import SyncManyReq
 from app.schemas.webhook import (
     ItemErrorWebhookReq,
     SyncUpdatesAvailableWebhookReq,
     WebhookUpdateAcknowledgedWebhookReq,
 )
 
-
-F = TypeVar("F", bound=Callable[..., Any])
-
 logger = getLogger(__name__)
 
-
-def handle_exceptions(handler: F) -> F:
-    @wraps(handler)
-    def wrapper(*args, **kwargs):
-        try:
-            logger.info("Doing job %s, %s.", args, kwargs)
-            for db in get_db():
-                handler(*args, db=db, **kwargs)
-            logger.info("Done job %s, %s.", args, kwargs)
-        except NoResultFound as e:
-            logger.error("An error occurred while processing webhook: %s", e)
-        except Exception as e:
-            logger.error("An unexpected error occurred while processing webhook: %s", e)
-
-    return wrapper
+# Handlers are run by app.worker from the job queue, with the job payload
+# validated as their req annotation: any exception they raise makes the job be
+# retried later, so they must be safe to run more than once.
 
 
-@handle_exceptions
 def handle_transactions_sync_updates_available(
     req: SyncUpdatesAvailableWebhookReq, db: Session
 ) -> None:
-    logger.info(req.__class__)
     user_institution_link_out = CRUDSyncableUserInstitutionLink.read(
         db, plaid_id=req.item_id
     )
-    user_out = CRUDUser.read(db, id=user_institution_link_out.user_id)
     try:
-        replacement_pattern_out = CRUDReplacementPattern.read(
-            db, user_institution_link_id=user_institution_link_out.id
-        )
-    except HTTPException:  # FIXME: should not throw http exceptions
-        replacement_pattern_out = None
-    sync_transactions(
-        db,
-        user_institution_link_out=user_institution_link_out,
-        replacement_pattern_out=replacement_pattern_out,
-        default_currency_code=user_out.default_currency_code,
-    )
-    logger.info("Finished syncing %s.", req.item_id)
+        changes = sync_user_institution_link(user_institution_link_out.id)
+    except ItemLoginRequired:
+        # Retrying will not help until the user logs in again through Link
+        logger.warning("%s requires a new login", req.item_id)
+        return
+    logger.info("Finished syncing %s, %s changes.", req.item_id, changes)
 
 
-@handle_exceptions
 def handle_item_webhook_update_acknowledged(
     req: WebhookUpdateAcknowledgedWebhookReq, db: Session
 ) -> None:
     logger.info("New URL: %s, Error: %s", req.new_webhook_url, req.error)
 
 
-@handle_exceptions
 def handle_item_error(req: ItemErrorWebhookReq, db: Session) -> None:
     logger.error("Plaid reported error %s", req.error)
 
 
-@handle_exceptions
-def handle_transactions_default_update(req: Any, db: Session) -> None: ...
+def handle_transactions_default_update(req: Any, db: Session) -> None:
+    ...
+
+
+def handle_category_icons(req: dict[str, Any], db: Session) -> None:
+    # Queued by syncs that met categories without an icon
+    fetch_category_icons(db)
+
+
+def handle_sync_all_user_institution_links(req: SyncManyReq, db: Session) -> None:
+    # Queued by the admin, items already syncing are skipped
+    sync_all_user_institution_links(req.workers, req.workers_per_user)
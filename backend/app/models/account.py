@@ -23,9 +23,9 @@ from sqlalchemy.orm import (
     relationship,
     mapped_column,
     WriteOnlyMapped,
-    object_session,
 )
 
+from app.models.balancecheckpoint import BalanceCheckpoint
 from app.models.common import Base, SyncableBase
 from app.models.transaction import Transaction
 from app.models.transactiondeserialiser import TransactionDeserialiser
@@ -41,6 +41,7 @@ class Account(SyncableBase):
 
     currency_code: Mapped[str]
     initial_balance: Mapped[Decimal]
+    current_balance: Mapped[Decimal] = mapped_column(index=True)
     name: Mapped[str]
     type: Mapped[str]
 
@@ -49,6 +50,9 @@ class Account(SyncableBase):
         cascade="all, delete",
         order_by=(desc(Transaction.timestamp), desc(Transaction.id)),
     )
+    balance_checkpoints: WriteOnlyMapped[BalanceCheckpoint] = relationship(
+        cascade="all, delete", passive_deletes=True
+    )
     default_bucket_id: Mapped[int] = mapped_column(ForeignKey("bucket.id"))
 
     __mapper_args__ = {
@@ -58,12 +62,7 @@ class Account(SyncableBase):
 
     @hybrid_property
     def balance(self) -> Decimal:
-        session = object_session(self)
-        assert session
-        transaction = session.scalars(self.transactions.select()).first()
-        if transaction:
-            return transaction.account_balance
-        return self.initial_balance
+        return self.current_balance
 
 
 class InstitutionalAccount(Account):
@@ -12,7 +12,11 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import base64
+import json
 import logging
+from datetime import date
+from decimal import Decimal
 from typing import Iterable, TypeVar, Type, Any
 
 from fastapi import HTTPException, status
@@ -25,15 +29,20 @@ from sqlalchemy import (
     asc,
     desc,
     func,
+    literal,
     types,
     select,
     String,
     case,
+    tuple_,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import DeclarativeBase, Session, mapped_column, Mapped
 
+from app.exceptions.common import InvalidCursorError
+
 BaseType = TypeVar("BaseType", bound="Base")
 SyncableBaseType = TypeVar("SyncableBaseType", bound="SyncableBase")
 
@@ -43,7 +52,7 @@ logger = logging.getLogger(__name__)
 def get_where_expressions(
     model: Any, **kwargs: Any
 ) -> Iterable[ColumnExpressionArgument[bool]]:
-    # Handle kwargs like amount__gt, amount__le__abs, timestamp__eq...
+    # Handle kwargs like amount__gt, amount__le__abs, timestamp__eq, id__in...
     # to construct model.amount > arg, abs(model.amount) <= arg, ...
     for kw, arg in kwargs.items():
         if arg is None:
@@ -56,7 +65,7 @@ def get_where_expressions(
             if ops[0] == "is_null":
                 ops[0] = "eq" if arg else "ne"
                 arg = None
-            op = f"__{ops[0]}__"
+            op = "in_" if ops[0] == "in" else f"__{ops[0]}__"
             if len(ops) == 2:
                 f = {"abs": func.abs}[ops[1]]
                 attr = f(attr)
@@ -64,13 +73,91 @@ def get_where_expressions(
 
 
 def get_order_by_expressions(
-    model: Any, order_by: str
+    model: Any, order_by: str, reverse: bool = False
 ) -> tuple[ColumnExpressionArgument[Any], ColumnExpressionArgument[int]]:
     attr, op = order_by.split("__")
+    if reverse:
+        op = {"asc": "desc", "desc": "asc"}[op]
     f = {"asc": asc, "desc": desc}[op]
     return f(getattr(model, attr)), f(model.id)
 
 
+def encode_cursor(value: Any, id: int) -> str:
+    # Opaque position of a row in a listing ordered by value, then id
+    data = json.dumps([value, id], default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def __parse_cursor_value(value: Any, python_type: type) -> Any:
+    if value is None:
+        return None
+    if python_type is date and isinstance(value, str):
+        return date.fromisoformat(value)
+    if python_type is Decimal and isinstance(value, (str, int)):
+        if not isinstance(value, bool) and (number := Decimal(value)).is_finite():
+            return number
+    if python_type is int and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(value)
+
+
+def decode_cursor(cursor: str, python_type: type) -> tuple[Any, int]:
+    # The value is parsed as the python type of the order_by column
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor))
+        value = __parse_cursor_value(value, python_type)
+    except (ValueError, TypeError, ArithmeticError):
+        raise InvalidCursorError(cursor)
+    if not isinstance(id, int) or isinstance(id, bool):
+        raise InvalidCursorError(cursor)
+    return value, id
+
+
+def get_cursor(row: Any, order_by: str | None) -> str:
+    # From a row as selected, whose order_by column may be null
+    attr, _ = (order_by or "id__asc").split("__")
+    return encode_cursor(getattr(row, attr), row.id)
+
+
+def get_cursor_expressions(
+    model: Any,
+    order_by: str | None,
+    after: str | None = None,
+    before: str | None = None,
+) -> Iterable[ColumnExpressionArgument[bool]]:
+    # Handle cursors as the row comparison (order_by column, id) > cursor, or <
+    # when ordered descending, which the (column, id) indexes can seek to.
+    # Nullable columns compare as (column is null, coalesce(column, ...), id):
+    # nulls are the greatest values, as in the ORDER BY.
+    attr, op = (order_by or "id__asc").split("__")
+    column = getattr(model, attr)
+    python_type = column.type.python_type
+    nullable = getattr(column, "nullable", True)
+    blank = {date: date.min, Decimal: Decimal(0), int: 0}.get(python_type)
+    for cursor, greater in ((after, op == "asc"), (before, op != "asc")):
+        if not cursor:
+            continue
+        value, id = decode_cursor(cursor, python_type)
+        if nullable:
+            position = tuple_(column.is_(None), func.coalesce(column, blank), model.id)
+            other = tuple_(
+                literal(value is None),
+                func.coalesce(literal(value, column.type), blank),
+                literal(id),
+            )
+        else:
+            if value is None:
+                raise InvalidCursorError(cursor)
+            position = tuple_(column, model.id)
+            other = tuple_(literal(value, column.type), literal(id))
+        yield position > other if greater else position < other
+
+
+def is_reversed(after: str | None, before: str | None) -> bool:
+    # Rows before a cursor alone are selected nearest first, then put back in order
+    return bool(before) and not after
+
+
 class Base(DeclarativeBase):
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -81,18 +168,28 @@ class Base(DeclarativeBase):
         order_by: str | None = None,
         page: int = 0,
         per_page: int = 0,
+        after: str | None = None,
+        before: str | None = None,
         **kwargs: Any,
     ) -> Select[tuple[BaseType]]:
+        if not order_by and (per_page or after or before):
+            # Pages and their cursors follow ids unless ordered otherwise
+            order_by = "id__asc"
+
         # SELECT
         statement = select(cls)
 
         # WHERE
         for expr in get_where_expressions(cls, **kwargs):
             statement = statement.where(expr)
+        for expr in get_cursor_expressions(cls, order_by, after, before):
+            statement = statement.where(expr)
 
         # ORDER BY
         if order_by:
-            order_exprs = get_order_by_expressions(cls, order_by)
+            order_exprs = get_order_by_expressions(
+                cls, order_by, is_reversed(after, before)
+            )
             statement = statement.order_by(*order_exprs)
 
         # GROUP BY
@@ -100,8 +197,9 @@ class Base(DeclarativeBase):
 
         # OFFSET, LIMIT
         if per_page:
-            offset = page * per_page
-            statement = statement.offset(offset).limit(per_page)
+            if not (after or before):
+                statement = statement.offset(page * per_page)
+            statement = statement.limit(per_page)
         return statement
 
     @classmethod
@@ -155,7 +253,7 @@ class Base(DeclarativeBase):
 class SyncableBase(Base):
     __abstract__ = True
     plaid_id: Mapped[str | None] = mapped_column(unique=True)
-    plaid_metadata: Mapped[str | None]
+    plaid_metadata: Mapped[dict[str, Any] | None] = mapped_column(JSONB)
 
     @hybrid_property
     def is_synced(self) -> bool:
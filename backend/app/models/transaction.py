@@ -18,7 +18,7 @@ from datetime import date
 from decimal import Decimal
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.models.category import Category
@@ -58,6 +58,12 @@ class Transaction(SyncableBase):
     )
     category: Mapped[Category | None] = relationship()
 
+    __table_args__ = (
+        Index(
+            "ix_transaction_account_id_timestamp_id", "account_id", "timestamp", "id"
+        ),
+    )
+
     is_group = False
 
     @property
@@ -13,9 +13,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import DateTime, ForeignKey, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.models.account import InstitutionalAccount
@@ -33,6 +34,13 @@ class UserInstitutionLink(SyncableBase):
     institution_id: Mapped[int] = mapped_column(ForeignKey("institution.id"))
     access_token: Mapped[str | None]
     cursor: Mapped[str | None]
+    # Periodic syncs, enqueued by app.scheduler once next_sync_at is due
+    last_synced_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    next_sync_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    # Syncs failed in a row, each one doubling the delay before the next
+    sync_failures: Mapped[int] = mapped_column(server_default="0")
 
     user: Mapped["User"] = relationship()
     institution: Mapped["Institution"] = relationship(back_populates="user_links")
@@ -40,3 +48,11 @@ class UserInstitutionLink(SyncableBase):
         back_populates="user_institution_link",
         cascade="all, delete",
     )
+
+    __table_args__ = (
+        Index(
+            "ix_user_institution_link_next_sync_at",
+            "next_sync_at",
+            postgresql_where=text("plaid_id IS NOT NULL"),
+        ),
+    )
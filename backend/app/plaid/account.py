@@ -22,7 +22,7 @@ from plaid.model.account_type import AccountType
 from plaid.model.accounts_get_request import AccountsGetRequest
 from plaid.model.accounts_get_response import AccountsGetResponse
 
-from app.plaid.common import client
+from app.plaid.common import client, serialize_model
 from app.schemas.account import (
     AccountPlaidIn,
     CreditPlaidIn,
@@ -50,7 +50,7 @@ def fetch_accounts(
             case "depository":
                 yield DepositoryPlaidIn(
                     plaid_id=account.account_id,
-                    plaid_metadata=account.to_str(),
+                    plaid_metadata=serialize_model(account),
                     mask=account.mask or "",
                     type=account.type.value,
                     name=account.name,
@@ -60,7 +60,7 @@ def fetch_accounts(
             case "credit":
                 yield CreditPlaidIn(
                     plaid_id=account.account_id,
-                    plaid_metadata=account.to_str(),
+                    plaid_metadata=serialize_model(account),
                     type=account.type.value,
                     name=account.name,
                     currency_code=account.balances.iso_currency_code,
@@ -70,7 +70,7 @@ def fetch_accounts(
             case "loan":
                 yield LoanPlaidIn(
                     plaid_id=account.account_id,
-                    plaid_metadata=account.to_str(),
+                    plaid_metadata=serialize_model(account),
                     type=account.type.value,
                     name=account.name,
                     currency_code=account.balances.iso_currency_code,
@@ -14,31 +14,40 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import csv
+import logging
 from io import BytesIO
 
 import requests
 import sqlalchemy
 from fastapi import HTTPException, status
 from plaid.model.personal_finance_category import PersonalFinanceCategory
-from requests import HTTPError
-from requests_cache import CachedSession
+from requests import HTTPError, RequestException
 from sqlalchemy.orm import Session
 
 from app.crud.category import CRUDSyncableCategory
+from app.crud.job import CRUDJob
+from app.plaid.common import serialize_model
 from app.schemas.category import CategoryPlaidIn
+from app.schemas.job import JobApiIn
+
+logger = logging.getLogger(__name__)
+
+FETCH_CATEGORY_ICONS_JOB = "handle_category_icons"
+ICON_URL = "https://plaid-category-icons.plaid.com/PFC_{}.png"
+TIMEOUT_SECONDS = 30
 
 
 def create_category_plaid_in(
     personal_finance_category: PersonalFinanceCategory,
-    personal_finance_category_icon_url: str,
+    icon: bytes = b"",
+    icon_url: str | None = None,
 ) -> CategoryPlaidIn:
     plaid_id: str = personal_finance_category.primary
     category_name = plaid_id.replace("_", " ").capitalize()
-    plaid_metadata = personal_finance_category.to_str()
-    with CachedSession(expire_after=None) as session:
-        response = session.get(personal_finance_category_icon_url)
-    response.raise_for_status()
-    icon = response.content
+    plaid_metadata = serialize_model(personal_finance_category)
+    if icon_url:
+        # Kept to fetch the icon later, see fetch_category_icons
+        plaid_metadata["personal_finance_category_icon_url"] = icon_url
     return CategoryPlaidIn(
         name=category_name,
         icon=icon,
@@ -47,6 +56,39 @@ def create_category_plaid_in(
     )
 
 
+def enqueue_category_icons(db: Session) -> None:
+    # Icons are fetched by app.worker, those that failed before included
+    if CRUDSyncableCategory.read_missing_icons(db):
+        job_in = JobApiIn(
+            name=FETCH_CATEGORY_ICONS_JOB, payload={}, key=FETCH_CATEGORY_ICONS_JOB
+        )
+        CRUDJob.enqueue(db, job_in)
+
+
+def fetch_category_icons(db: Session) -> None:
+    # Fetches the icons of the synced categories that have none, committing each
+    # one, and raises the last error so that the job is retried for the others
+    error: RequestException | None = None
+    missing_icons = CRUDSyncableCategory.read_missing_icons(db)
+    with requests.Session() as session:
+        for category_id, (plaid_id, icon_url) in missing_icons.items():
+            try:
+                response = session.get(
+                    icon_url or ICON_URL.format(plaid_id), timeout=TIMEOUT_SECONDS
+                )
+                response.raise_for_status()
+            except RequestException as e:
+                logger.warning(
+                    "Could not fetch icon of category %s: %s", category_id, e
+                )
+                error = e
+                continue
+            CRUDSyncableCategory.update_icon(db, category_id, response.content)
+            db.commit()
+    if error:
+        raise error
+
+
 def get_all_plaid_categories(db: Session) -> None:
     with requests.session() as session:
         response = session.get(
@@ -71,7 +113,7 @@ def get_all_plaid_categories(db: Session) -> None:
                 name=plaid_id.replace("_", " ").capitalize(),
                 icon=icon,
                 plaid_id=plaid_id,
-                plaid_metadata=plaid_id,
+                plaid_metadata={"primary": plaid_id},
             )
             try:
                 category_out = CRUDSyncableCategory.read(
@@ -13,8 +13,13 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import copy
+import itertools
 import logging
 import os
+import threading
+import time
+from typing import Any, TypeVar
 
 import plaid
 from plaid.api.plaid_api import PlaidApi
@@ -30,9 +35,16 @@ from plaid.model.link_token_create_request_update import LinkTokenCreateRequestU
 from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
 from plaid.model.link_token_create_response import LinkTokenCreateResponse
 from plaid.model.products import Products
+from plaid.model_utils import OpenApiModel, validate_and_convert_types
+
+from app.plaid.ratelimit import RateLimiter, get_retry_delay, is_retryable
+from app.schemas.plaid import PlaidEndpointStatsApiOut
+from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
+OpenApiModelT = TypeVar("OpenApiModelT", bound=OpenApiModel)
+
 PLAID_CLIENT_ID = os.environ["PLAID_CLIENT_ID"]
 PLAID_SECRET = os.environ["PLAID_SECRET"]
 PLAID_ENV = os.environ["PLAID_ENV"]
@@ -46,6 +58,9 @@ match PLAID_ENV:
         host = plaid.Environment.Development
     case "production":
         host = plaid.Environment.Production
+    case "local":
+        # Stand-in server from scripts/fake_plaid.py
+        host = os.environ.get("PLAID_LOCAL_HOST", "http://localhost:8001")
     case _:
         exit()
 
@@ -58,12 +73,108 @@ configuration = plaid.Configuration(
     },
 )
 
-api_client = plaid.ApiClient(configuration)
-client = PlaidApi(api_client)
+
+class InstrumentedApiClient(plaid.ApiClient):
+    # Applies the default timeouts and the rate limits to every call, retries
+    # those Plaid rate limited, or failed on its side for idempotent ones, and
+    # records the latency of every attempt per endpoint. The underlying urllib3
+    # pool manager is thread-safe, so a single instance is shared by all the
+    # threads of a process
+    def __init__(self, configuration: plaid.Configuration) -> None:
+        super().__init__(configuration)
+        self.timeout = (
+            settings.PLAID_CONNECT_TIMEOUT_SECONDS,
+            settings.PLAID_READ_TIMEOUT_SECONDS,
+        )
+        self.rate_limiter = RateLimiter(settings.PLAID_RATE_LIMIT_SHARE)
+        self.stats: dict[str, PlaidEndpointStatsApiOut] = {}
+        self.stats_lock = threading.Lock()
+
+    def call_api(
+        self, resource_path: str, method: str, *args: Any, **kwargs: Any
+    ) -> Any:
+        if kwargs.get("_request_timeout") is None:
+            kwargs["_request_timeout"] = self.timeout
+        body = kwargs.get("body")
+        access_token = body.get("access_token") if body is not None else None
+        for attempt in itertools.count():
+            throttled = self.rate_limiter.acquire(resource_path, access_token)
+            start = time.perf_counter()
+            try:
+                response = super().call_api(resource_path, method, *args, **kwargs)
+            except plaid.ApiException as e:
+                retry = attempt < settings.PLAID_MAX_RETRIES and is_retryable(
+                    e, resource_path
+                )
+                self.record(
+                    resource_path,
+                    time.perf_counter() - start,
+                    throttled,
+                    failed=True,
+                    retried=retry,
+                )
+                if not retry:
+                    raise
+                delay = get_retry_delay(e, attempt)
+                logger.warning(
+                    "Plaid %s failed with status %s, retrying in %.1f s",
+                    resource_path,
+                    e.status,
+                    delay,
+                )
+                time.sleep(delay)
+            except Exception:
+                self.record(
+                    resource_path, time.perf_counter() - start, throttled, failed=True
+                )
+                raise
+            else:
+                self.record(resource_path, time.perf_counter() - start, throttled)
+                return response
+
+    def record(
+        self,
+        endpoint: str,
+        seconds: float,
+        throttled_seconds: float,
+        failed: bool = False,
+        retried: bool = False,
+    ) -> None:
+        logger.debug("Plaid %s took %.3f s", endpoint, seconds)
+        with self.stats_lock:
+            stats = self.stats.setdefault(
+                endpoint, PlaidEndpointStatsApiOut(endpoint=endpoint)
+            )
+            stats.calls += 1
+            stats.errors += failed
+            stats.retries += retried
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.throttled_seconds += throttled_seconds
+
+    def read_stats(self) -> list[PlaidEndpointStatsApiOut]:
+        with self.stats_lock:
+            return [stats.model_copy() for _, stats in sorted(self.stats.items())]
+
+
+def create_client(pool_maxsize: int = settings.PLAID_POOL_MAXSIZE) -> PlaidApi:
+    # urllib3 opens at most pool_maxsize keep-alive connections per host,
+    # connections beyond that are closed after use instead of reused
+    client_configuration = copy.deepcopy(configuration)
+    client_configuration.connection_pool_maxsize = pool_maxsize
+    return PlaidApi(InstrumentedApiClient(client_configuration))
+
+
+client = create_client()
 products = [Products(p) for p in PLAID_PRODUCTS]
 country_codes = [CountryCode(cc) for cc in PLAID_COUNTRY_CODES]
 
 
+def read_client_stats() -> list[PlaidEndpointStatsApiOut]:
+    api_client: InstrumentedApiClient = client.api_client
+    return api_client.read_stats()
+
+
 def create_link_token(user_id: int, access_token: str | None = None) -> str:
     if access_token:
         request = LinkTokenCreateRequest(
@@ -96,3 +207,24 @@ def exchange_public_token(public_token: str) -> str:
     )
     access_token: str = response.access_token
     return access_token
+
+
+def serialize_model(model: OpenApiModel) -> dict[str, Any]:
+    # JSON-compatible dict as sent by Plaid, stored as JSONB plaid_metadata
+    data: dict[str, Any] = plaid.ApiClient.sanitize_for_serialization(model)
+    return data
+
+
+def deserialize_model(
+    data: dict[str, Any], model_type: type[OpenApiModelT]
+) -> OpenApiModelT:
+    # Inverse of serialize_model. Nested lists are converted in place, hence the copy
+    model: OpenApiModelT = validate_and_convert_types(
+        copy.deepcopy(data),
+        (model_type,),
+        ["plaid_metadata"],
+        True,
+        True,
+        configuration,
+    )
+    return model
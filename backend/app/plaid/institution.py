@@ -22,7 +22,7 @@ from plaid.model.institutions_get_by_id_request_options import (
 )
 from plaid.model.institutions_get_by_id_response import InstitutionsGetByIdResponse
 
-from app.plaid.common import client, country_codes
+from app.plaid.common import client, country_codes, serialize_model
 from app.schemas.institution import InstitutionPlaidIn
 
 
@@ -41,5 +41,5 @@ def fetch_institution(plaid_id: str) -> InstitutionPlaidIn:
         url=getattr(institution, "url", None),
         logo=b64decode(institution.logo) if hasattr(institution, "logo") else None,
         colour=getattr(institution, "primary_color", None),
-        plaid_metadata=institution.to_str(),
+        plaid_metadata=serialize_model(institution),
     )
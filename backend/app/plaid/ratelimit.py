@@ -0,0 +1,130 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import random
+import threading
+import time
+
+import plaid
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_EXCEEDED = "RATE_LIMIT_EXCEEDED"
+
+# Plaid's production limits in requests per minute, per client and per item
+RATE_LIMITS: dict[str, tuple[float, float]] = {
+    "/accounts/get": (15000, 15),
+    "/institutions/get_by_id": (400, 0),
+    "/item/get": (5000, 15),
+    "/transactions/get": (20000, 30),
+    "/transactions/sync": (2500, 50),
+}
+# Endpoints without a documented limit
+DEFAULT_RATE_LIMIT: tuple[float, float] = (1000, 15)
+# Read-only endpoints, safe to call again after failing on Plaid's side.
+# Rate limited calls were not processed and are retried on any endpoint
+IDEMPOTENT_ENDPOINTS = frozenset(
+    {
+        "/accounts/get",
+        "/institutions/get_by_id",
+        "/transactions/get",
+        "/transactions/sync",
+    }
+)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float) -> None:
+        # A tenth of the limit can be spent at once, the rest refills over the
+        # minute, so that no 60 s window exceeds the limit
+        self.capacity = max(1.0, per_minute / 10)
+        self.rate = max(per_minute - self.capacity, 1) / 60
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        # Takes a token, possibly in advance, and returns how long to wait for it
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+    # Buckets live in memory, so share is the fraction of Plaid's per client
+    # limits used by each process calling Plaid. Per item limits are used in full
+    # as an item is synced by one process at a time. A share of 0 disables it
+    def __init__(self, share: float) -> None:
+        self.share = share
+        self.buckets: dict[tuple[str, str | None], TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def __bucket(self, endpoint: str, access_token: str | None) -> TokenBucket | None:
+        per_client, per_item = RATE_LIMITS.get(endpoint, DEFAULT_RATE_LIMIT)
+        per_minute = per_item if access_token else per_client * self.share
+        if not per_minute:
+            return None
+        key = (endpoint, access_token)
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(per_minute)
+        return self.buckets[key]
+
+    def acquire(self, endpoint: str, access_token: str | None) -> float:
+        # Waits for both the client and the item buckets, returns the time waited
+        if not self.share:
+            return 0
+        with self.lock:
+            delay = 0.0
+            for key in {None, access_token}:
+                bucket = self.__bucket(endpoint, key)
+                if bucket:
+                    delay = max(delay, bucket.reserve())
+        if delay:
+            logger.debug("Throttling Plaid %s for %.2f s", endpoint, delay)
+            time.sleep(delay)
+        return delay
+
+
+def is_retryable(e: plaid.ApiException, endpoint: str) -> bool:
+    if e.status == 429:
+        return True
+    try:
+        error = json.loads(e.body or "{}")
+    except ValueError:
+        error = None
+    if isinstance(error, dict) and error.get("error_type") == RATE_LIMIT_EXCEEDED:
+        return True
+    return bool(e.status and e.status >= 500) and endpoint in IDEMPOTENT_ENDPOINTS
+
+
+def get_retry_delay(e: plaid.ApiException, attempt: int) -> float:
+    # Retry-After when given, exponential backoff with full jitter otherwise
+    retry_after = (e.headers or {}).get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), settings.PLAID_RETRY_MAX_DELAY_SECONDS)
+    return random.uniform(
+        0,
+        min(
+            settings.PLAID_RETRY_DELAY_SECONDS * 2**attempt,
+            settings.PLAID_RETRY_MAX_DELAY_SECONDS,
+        ),
+    )
@@ -0,0 +1,64 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from typing import Any
+
+from plaid.model.personal_finance_category import PersonalFinanceCategory
+from sqlalchemy.orm import Session
+
+from app.crud.account import CRUDSyncableAccount
+from app.crud.category import CRUDSyncableCategory
+from app.plaid.category import create_category_plaid_in, enqueue_category_icons
+from app.plaid.common import deserialize_model
+from app.schemas.account import AccountPlaidOut
+
+logger = logging.getLogger(__name__)
+
+
+class SyncContext:
+    # Lookups loaded in bulk once per sync run instead of once per transaction:
+    # accounts by Plaid id and categories by Plaid primary. Icons of new
+    # categories are fetched by a job queued after the sync.
+    def __init__(self, db: Session, user_institution_link_id: int | None = None):
+        self.db = db
+        self.accounts: dict[str, AccountPlaidOut] = {}
+        if user_institution_link_id:
+            self.accounts = {
+                account.plaid_id: account
+                for account in CRUDSyncableAccount.read_many(
+                    db, user_institution_link_id=user_institution_link_id
+                )
+            }
+        self.category_ids = CRUDSyncableCategory.read_plaid_ids(db)
+
+    def get_category_id(
+        self,
+        personal_finance_category: dict[str, Any],
+        icon_url: str | None,
+    ) -> int:
+        # The plaid model is only built for categories that have to be created
+        primary = personal_finance_category["primary"]
+        if primary not in self.category_ids:
+            category_in = create_category_plaid_in(
+                deserialize_model(personal_finance_category, PersonalFinanceCategory),
+                icon_url=icon_url,
+            )
+            category_out = CRUDSyncableCategory.create(self.db, category_in)
+            self.category_ids[primary] = category_out.id
+        return self.category_ids[primary]
+
+    def enqueue_category_icons(self) -> None:
+        enqueue_category_icons(self.db)
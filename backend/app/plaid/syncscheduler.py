@@ -0,0 +1,179 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import logging
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from fastapi import HTTPException
+from plaid import ApiException
+from sqlalchemy.orm import Session
+
+from app.crud.job import CRUDJob
+from app.crud.replacementpattern import CRUDReplacementPattern
+from app.crud.user import CRUDUser
+from app.crud.userinstitutionlink import CRUDSyncableUserInstitutionLink
+from app.database.deps import engine
+from app.exceptions.userinstitutionlink import ItemLoginRequired, SyncInProgress
+from app.plaid.ratelimit import RATE_LIMIT_EXCEEDED
+from app.plaid.userinstitutionlink import sync_transactions
+from app.schemas.job import JobApiIn, JobApiOut
+from app.schemas.userinstitutionlink import SyncManyReq, SyncReportApiOut
+
+logger = logging.getLogger(__name__)
+
+ITEM_LOGIN_REQUIRED = "ITEM_LOGIN_REQUIRED"
+SYNC_ALL_JOB = "handle_sync_all_user_institution_links"
+
+
+def sync_user_institution_link(user_institution_link_id: int) -> int:
+    # Sync a single item in its own connection and session, holding its lock
+    with engine.connect() as connection, Session(connection) as db:
+        with CRUDSyncableUserInstitutionLink.lock(db, user_institution_link_id):
+            user_institution_link_out = CRUDSyncableUserInstitutionLink.read(
+                db, id=user_institution_link_id
+            )
+            user_out = CRUDUser.read(db, id=user_institution_link_out.user_id)
+            try:
+                replacement_pattern_out = CRUDReplacementPattern.read(
+                    db, user_institution_link_id=user_institution_link_id
+                )
+            except HTTPException:
+                replacement_pattern_out = None
+            try:
+                changes = sync_transactions(
+                    db,
+                    user_institution_link_out,
+                    replacement_pattern_out,
+                    user_out.default_currency_code,
+                )
+            except ApiException as e:
+                error = json.loads(e.body or "{}")
+                if (
+                    error.get("error_code") != ITEM_LOGIN_REQUIRED
+                    and error.get("error_type") != RATE_LIMIT_EXCEEDED
+                ):
+                    raise
+                # Back off the periodic syncs of the item
+                db.rollback()
+                CRUDSyncableUserInstitutionLink.update_sync_state(
+                    db, user_institution_link_id, succeeded=False
+                )
+                db.commit()
+                if error.get("error_code") == ITEM_LOGIN_REQUIRED:
+                    raise ItemLoginRequired() from e
+                raise
+            db.commit()
+            return changes
+
+
+def sync_many_user_institution_links(
+    user_institution_link_ids: dict[int, list[int]],
+    workers: int = 4,
+    workers_per_user: int = 1,
+) -> SyncReportApiOut:
+    # Fan out the syncs of the given items, by user id, over a pool of workers.
+    # Users are served round-robin and each one gets at most workers_per_user
+    # workers at a time, so that a user with many items does not starve others.
+    queues = {u: deque(ids) for u, ids in user_institution_link_ids.items() if ids}
+    users = deque(queues)
+    running: dict[Future[int], tuple[int, int]] = {}
+    user_workers: Counter[int] = Counter()
+    report = SyncReportApiOut(items=sum(len(q) for q in queues.values()))
+    start = time.perf_counter()
+
+    def next_item() -> tuple[int, int] | None:
+        for _ in range(len(users)):
+            user_id = users[0]
+            users.rotate(-1)
+            if queues[user_id] and user_workers[user_id] < workers_per_user:
+                return user_id, queues[user_id].popleft()
+        return None
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="sync") as executor:
+        while True:
+            while len(running) < workers and (item := next_item()):
+                user_id, user_institution_link_id = item
+                future = executor.submit(
+                    sync_user_institution_link, user_institution_link_id
+                )
+                running[future] = item
+                user_workers[user_id] += 1
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                user_id, user_institution_link_id = running.pop(future)
+                user_workers[user_id] -= 1
+                try:
+                    report.transactions += future.result()
+                    report.succeeded += 1
+                except SyncInProgress:
+                    logger.info("Skipped %s, already syncing", user_institution_link_id)
+                    report.skipped += 1
+                except Exception as e:
+                    logger.error("Failed to sync %s: %s", user_institution_link_id, e)
+                    report.failed += 1
+
+    report.seconds = time.perf_counter() - start
+    logger.info(
+        "Synced %s items (%s failed, %s skipped), %s transactions in %.1f s: "
+        "%.2f items/s, %.1f transactions/s",
+        report.succeeded,
+        report.failed,
+        report.skipped,
+        report.transactions,
+        report.seconds,
+        report.items_per_second,
+        report.transactions_per_second,
+    )
+    return report
+
+
+def sync_all_user_institution_links(
+    workers: int = 4, workers_per_user: int = 1
+) -> SyncReportApiOut:
+    user_institution_link_ids: dict[int, list[int]] = defaultdict(list)
+    with Session(engine) as db:
+        for user_institution_link_out in CRUDSyncableUserInstitutionLink.read_many(
+            db, plaid_id__is_null=False
+        ):
+            user_institution_link_ids[user_institution_link_out.user_id].append(
+                user_institution_link_out.id
+            )
+    return sync_many_user_institution_links(
+        user_institution_link_ids, workers, workers_per_user
+    )
+
+
+def enqueue_sync_all_user_institution_links(
+    db: Session, req: SyncManyReq
+) -> JobApiOut | None:
+    # Synced by app.worker, which logs the report, coalesced with a pending one
+    job_in = JobApiIn(name=SYNC_ALL_JOB, payload=req.model_dump(), key=SYNC_ALL_JOB)
+    return CRUDJob.enqueue(db, job_in)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Sync every Plaid item")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--workers-per-user", type=int, default=1)
+    args = parser.parse_args()
+    req = SyncManyReq(workers=args.workers, workers_per_user=args.workers_per_user)
+    sync_all_user_institution_links(req.workers, req.workers_per_user)
@@ -13,11 +13,17 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import date
-from typing import Iterable
+from decimal import Decimal
+from queue import Full, Queue
+from threading import Event, Thread
+from typing import Generator, Iterable
 
-import sqlalchemy
+from plaid import ApiException
 from plaid.models import (
     ItemWebhookUpdateRequest,
     Item,
@@ -34,21 +40,32 @@ from plaid.models import (
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
-from app.crud.account import CRUDAccount, CRUDSyncableAccount
 from app.crud.transaction import CRUDSyncableTransaction
 from app.crud.userinstitutionlink import CRUDSyncableUserInstitutionLink
-from app.plaid.common import client
+from app.plaid.common import client, serialize_model
+from app.plaid.synccontext import SyncContext
 from app.plaid.transaction import create_transaction_plaid_in
-from app.schemas.account import AccountPlaidOut
 from app.schemas.replacementpattern import ReplacementPatternApiOut
 from app.schemas.transaction import TransactionPlaidIn
 from app.schemas.userinstitutionlink import (
     UserInstitutionLinkPlaidIn,
     UserInstitutionLinkPlaidOut,
 )
+from app.settings import settings
+from app.utils.exchangerate import get_exchange_rates
 
 logger = logging.getLogger(__name__)
 
+TWO_PLACES = Decimal(10) ** -2
+
+# Pages fetched ahead of the one being written during a transactions sync
+SYNC_PREFETCH_PAGES = 2
+# Times a sync restarts its pagination loop when Plaid reports a mutation
+SYNC_MAX_RESTARTS = 3
+# Largest page Plaid returns from /transactions/get
+TRANSACTIONS_GET_MAX_COUNT = 500
+MUTATION_DURING_PAGINATION = "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"
+
 
 class __TransactionsSyncResult(BaseModel):
     added: list[tuple[int, TransactionPlaidIn]]
@@ -58,45 +75,86 @@ class __TransactionsSyncResult(BaseModel):
     has_more: bool
 
 
-def __get_accounts_map(
-    db: Session, user_institution_link_id: int
-) -> dict[str, AccountPlaidOut]:
-    return {
-        account.plaid_id: account
-        for account in CRUDSyncableAccount.read_many(
-            db, user_institution_link_id=user_institution_link_id
-        )
-    }
-
-
-def __fetch_transaction_changes(
-    db: Session,
-    user_institution_link: UserInstitutionLinkPlaidOut,
-    replacement_pattern: ReplacementPatternApiOut | None,
-) -> __TransactionsSyncResult:
+def __request_transaction_changes(
+    access_token: str, cursor: str | None
+) -> TransactionsSyncResponse:
     options = TransactionsSyncRequestOptions(
         include_personal_finance_category=True,
         include_logo_and_counterparty_beta=True,
     )
-    if user_institution_link.cursor:
+    if cursor:
         request = TransactionsSyncRequest(
-            access_token=user_institution_link.access_token,
-            cursor=user_institution_link.cursor,
+            access_token=access_token,
+            cursor=cursor,
             options=options,
         )
     else:
         request = TransactionsSyncRequest(
-            access_token=user_institution_link.access_token,
+            access_token=access_token,
             options=options,
         )
     response: TransactionsSyncResponse = client.transactions_sync(request)
-    accounts = __get_accounts_map(db, user_institution_link.id)
+    return response
+
+
+def __fetch_transaction_pages(
+    access_token: str, cursor: str | None
+) -> Generator[tuple[str | None, TransactionsSyncResponse], None, None]:
+    # Fetch pages in a background thread, at most SYNC_PREFETCH_PAGES ahead of the
+    # consumer, following each provisional next_cursor until has_more is false.
+    # Yields every page with the cursor it was requested with.
+    pages: Queue[tuple[str | None, TransactionsSyncResponse] | Exception] = Queue(
+        SYNC_PREFETCH_PAGES
+    )
+    stop = Event()
+
+    def put(item: tuple[str | None, TransactionsSyncResponse] | Exception) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def fetch() -> None:
+        request_cursor = cursor
+        try:
+            while True:
+                response = __request_transaction_changes(access_token, request_cursor)
+                if not put((request_cursor, response)) or not response.has_more:
+                    return
+                request_cursor = response.next_cursor
+        except Exception as e:
+            put(e)
+
+    thread = Thread(target=fetch, name="plaid-sync-fetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pages.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+            if not item[1].has_more:
+                return
+    finally:
+        stop.set()
+        thread.join()
+
+
+def __parse_transaction_changes(
+    context: SyncContext,
+    response: TransactionsSyncResponse,
+    replacement_pattern: ReplacementPatternApiOut | None,
+) -> __TransactionsSyncResult:
+    accounts = context.accounts
     return __TransactionsSyncResult(
         added=[
             (
                 accounts[transaction.account_id].id,
                 create_transaction_plaid_in(
-                    db,
+                    context,
                     transaction,
                     replacement_pattern,
                     accounts[transaction.account_id].default_bucket_id,
@@ -108,7 +166,7 @@ def __fetch_transaction_changes(
             (
                 accounts[transaction.account_id].id,
                 create_transaction_plaid_in(
-                    db,
+                    context,
                     transaction,
                     replacement_pattern,
                     accounts[transaction.account_id].default_bucket_id,
@@ -125,6 +183,43 @@ def __fetch_transaction_changes(
     )
 
 
+def __ingest_transaction_changes(
+    db: Session,
+    sync_result: __TransactionsSyncResult,
+    currency_codes: dict[int, str],
+    default_currency_code: str,
+) -> None:
+    # Write the whole page with one upsert and one delete
+    changes = sync_result.added + sync_result.modified
+    timestamps: dict[str, set[date]] = defaultdict(set)
+    for account_id, transaction_in in changes:
+        timestamps[currency_codes[account_id]].add(transaction_in.timestamp)
+    exchange_rates = {
+        currency_code: get_exchange_rates(
+            currency_code, default_currency_code, currency_timestamps
+        )
+        for currency_code, currency_timestamps in timestamps.items()
+    }
+    values = []
+    for account_id, transaction_in in changes:
+        exchange_rate = exchange_rates[currency_codes[account_id]][
+            transaction_in.timestamp
+        ]
+        values.append(
+            {
+                **transaction_in.model_dump(),
+                "account_id": account_id,
+                "amount_default_currency": (
+                    transaction_in.amount * exchange_rate
+                ).quantize(TWO_PLACES),
+                "account_balance": Decimal(0),
+            }
+        )
+    with CRUDSyncableTransaction.defer_account_balances(db):
+        CRUDSyncableTransaction.upsert_many(db, values)
+        CRUDSyncableTransaction.delete_many(db, sync_result.removed)
+
+
 def fetch_user_institution_link(access_token: str) -> UserInstitutionLinkPlaidIn:
     request = ItemGetRequest(access_token=access_token)
     response: ItemGetResponse = client.item_get(request)
@@ -132,7 +227,7 @@ def fetch_user_institution_link(access_token: str) -> UserInstitutionLinkPlaidIn
     user_institution_link_in = UserInstitutionLinkPlaidIn(
         plaid_id=item.item_id,
         access_token=access_token,
-        plaid_metadata=item.to_str(),
+        plaid_metadata=serialize_model(item),
     )
     return user_institution_link_in
 
@@ -142,6 +237,24 @@ def update_item_webhook(access_token: str, webhook_url: str) -> None:
     client.item_webhook_update(request)
 
 
+def __request_transactions(
+    access_token: str, start_date: date, end_date: date, offset: int
+) -> TransactionsGetResponse:
+    request = TransactionsGetRequest(
+        access_token=access_token,
+        start_date=start_date,
+        end_date=end_date,
+        options=TransactionsGetRequestOptions(
+            include_personal_finance_category=True,
+            include_logo_and_counterparty_beta=True,
+            count=TRANSACTIONS_GET_MAX_COUNT,
+            offset=offset,
+        ),
+    )
+    response: TransactionsGetResponse = client.transactions_get(request)
+    return response
+
+
 def fetch_transactions(
     db: Session,
     user_institution_link: UserInstitutionLinkPlaidOut,
@@ -149,25 +262,51 @@ def fetch_transactions(
     end_date: date,
     replacement_pattern: ReplacementPatternApiOut | None,
 ) -> Iterable[TransactionPlaidIn]:
-    offset = 0
-    total_transactions = 1
-    while offset < total_transactions:
-        request = TransactionsGetRequest(
-            access_token=user_institution_link.access_token,
-            start_date=start_date,
-            end_date=end_date,
-            options=TransactionsGetRequestOptions(
-                include_personal_finance_category=True,
-                include_logo_and_counterparty_beta=True,
-                offset=offset,
-            ),
-        )
-        response: TransactionsGetResponse = client.transactions_get(request)
-        total_transactions = response.total_transactions
-        transactions: list[Transaction] = response.transactions
-        offset += len(transactions)
-        for transaction in transactions:
-            yield create_transaction_plaid_in(db, transaction, replacement_pattern)
+    # The first page tells the total, the following ones are requested
+    # concurrently, at most PLAID_TRANSACTIONS_GET_WORKERS at a time, and
+    # yielded in order
+    context = SyncContext(db, user_institution_link.id)
+    response = __request_transactions(
+        user_institution_link.access_token, start_date, end_date, 0
+    )
+    total_transactions = response.total_transactions
+    offset = TRANSACTIONS_GET_MAX_COUNT
+    futures: deque[Future[TransactionsGetResponse]] = deque()
+    executor = ThreadPoolExecutor(
+        settings.PLAID_TRANSACTIONS_GET_WORKERS, thread_name_prefix="plaid-get"
+    )
+    try:
+        while True:
+            # Follow the total, which grows if transactions are added meanwhile
+            total_transactions = max(total_transactions, response.total_transactions)
+            while (
+                offset < total_transactions
+                and len(futures) < settings.PLAID_TRANSACTIONS_GET_WORKERS
+            ):
+                futures.append(
+                    executor.submit(
+                        __request_transactions,
+                        user_institution_link.access_token,
+                        start_date,
+                        end_date,
+                        offset,
+                    )
+                )
+                offset += TRANSACTIONS_GET_MAX_COUNT
+            transactions: list[Transaction] = response.transactions
+            for transaction in transactions:
+                yield create_transaction_plaid_in(
+                    context,
+                    transaction,
+                    replacement_pattern,
+                    context.accounts[transaction.account_id].default_bucket_id,
+                )
+            if not futures:
+                break
+            response = futures.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+    context.enqueue_category_icons()
 
 
 def sync_transactions(
@@ -175,41 +314,84 @@ def sync_transactions(
     user_institution_link_out: UserInstitutionLinkPlaidOut,
     replacement_pattern_out: ReplacementPatternApiOut | None,
     default_currency_code: str,
-) -> None:
+) -> int:
+    # Returns the number of transactions added, modified or removed
+    context = SyncContext(db, user_institution_link_out.id)
+    currency_codes = {
+        account.id: account.currency_code for account in context.accounts.values()
+    }
+    changes = 0
+    # Cursor of the first request of the current pagination loop, which it has
+    # to be restarted from if Plaid reports a mutation during pagination
+    loop_cursor: str | None = user_institution_link_out.cursor
+    cursor = loop_cursor
+    restarts = 0
     has_more = True
     while has_more:
-        sync_result = __fetch_transaction_changes(
-            db, user_institution_link_out, replacement_pattern_out
+        pages = __fetch_transaction_pages(
+            user_institution_link_out.access_token, cursor
         )
-        for account_id, transaction_in in sync_result.added:
-            try:
-                CRUDAccount.create_transaction(
-                    db,
-                    account_id,
-                    transaction_in,
-                    default_currency_code=default_currency_code,
+        try:
+            for request_cursor, response in pages:
+                sync_result = __parse_transaction_changes(
+                    context, response, replacement_pattern_out
+                )
+                # Commit each page with its cursor, so that an interrupted sync
+                # resumes from the last committed page
+                committed_cursor = CRUDSyncableUserInstitutionLink.lock_cursor(
+                    db, user_institution_link_out.id
+                )
+                if committed_cursor != request_cursor:
+                    # Another sync moved the cursor past this page: start over
+                    logger.info(
+                        "Cursor of %s moved, refetching", user_institution_link_out.id
+                    )
+                    db.commit()
+                    loop_cursor = cursor = committed_cursor
+                    break
+                changes += (
+                    len(sync_result.added)
+                    + len(sync_result.modified)
+                    + len(sync_result.removed)
                 )
-            except sqlalchemy.exc.IntegrityError:
-                logger.warning("Repeated transaction: %s", str(transaction_in))
-        for account_id, transaction_in in sync_result.modified:
-            transaction_out = CRUDSyncableTransaction.read(
-                db, plaid_id=transaction_in.plaid_id
+                __ingest_transaction_changes(
+                    db, sync_result, currency_codes, default_currency_code
+                )
+                CRUDSyncableUserInstitutionLink.update_cursor(
+                    db, user_institution_link_out.id, sync_result.new_cursor
+                )
+                db.commit()
+                cursor = sync_result.new_cursor
+                has_more = sync_result.has_more
+        except ApiException as e:
+            error_code = json.loads(e.body or "{}").get("error_code")
+            if (
+                error_code != MUTATION_DURING_PAGINATION
+                or restarts == SYNC_MAX_RESTARTS
+            ):
+                raise
+            restarts += 1
+            logger.warning(
+                "Transactions of %s changed during pagination, restarting",
+                user_institution_link_out.id,
             )
-            CRUDAccount.update_transaction(
-                db,
-                account_id,
-                transaction_out.id,
-                transaction_in,
-                default_currency_code=default_currency_code,
+            # Pages already committed are applied again, which is idempotent
+            committed_cursor = CRUDSyncableUserInstitutionLink.lock_cursor(
+                db, user_institution_link_out.id
             )
-        for plaid_id in sync_result.removed:
-            transaction_out = CRUDSyncableTransaction.read(db, plaid_id=plaid_id)
-            CRUDSyncableTransaction.delete(db, transaction_out.id)
-        user_institution_link_out.cursor = sync_result.new_cursor
-        user_institution_link_new = UserInstitutionLinkPlaidIn(
-            **user_institution_link_out.model_dump()
-        )
-        CRUDSyncableUserInstitutionLink.update(
-            db, user_institution_link_out.id, user_institution_link_new
-        )
-        has_more = sync_result.has_more
+            if committed_cursor == cursor:
+                CRUDSyncableUserInstitutionLink.update_cursor(
+                    db, user_institution_link_out.id, loop_cursor
+                )
+            else:
+                loop_cursor = committed_cursor
+            db.commit()
+            cursor = loop_cursor
+        finally:
+            # Stop the fetcher thread if the loop was left early
+            pages.close()
+    CRUDSyncableUserInstitutionLink.update_sync_state(
+        db, user_institution_link_out.id, succeeded=True
+    )
+    context.enqueue_category_icons()
+    return changes
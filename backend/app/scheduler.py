@@ -0,0 +1,95 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import random
+import signal
+from datetime import datetime, timedelta, timezone
+from threading import Event
+from types import FrameType
+
+from sqlalchemy.orm import Session
+
+from app import handlers
+from app.crud.job import CRUDJob
+from app.crud.userinstitutionlink import CRUDSyncableUserInstitutionLink
+from app.database.deps import engine
+from app.plaid.common import PLAID_ENV
+from app.schemas.job import JobApiIn
+from app.schemas.webhook import SyncUpdatesAvailableWebhookReq
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+SYNC_JOB_NAME = handlers.handle_transactions_sync_updates_available.__name__
+
+
+class Scheduler:
+    # Enqueues the periodic syncs of the items for app.worker, as the same jobs
+    # as sync webhooks so that both are coalesced
+    def __init__(self) -> None:
+        self.stopped = Event()
+
+    def stop(self, signum: int, frame: FrameType | None) -> None:
+        logger.info("Stopping scheduler...")
+        self.stopped.set()
+
+    def schedule(self) -> int:
+        # Enqueue a batch of due items, returns how many there were
+        with Session(engine) as db:
+            user_institution_links_out = CRUDSyncableUserInstitutionLink.claim_due(
+                db, settings.SCHEDULER_BATCH_SIZE
+            )
+            now = datetime.now(timezone.utc)
+            for user_institution_link_out in user_institution_links_out:
+                req = SyncUpdatesAvailableWebhookReq(
+                    webhook_type="TRANSACTIONS",
+                    webhook_code="SYNC_UPDATES_AVAILABLE",
+                    item_id=user_institution_link_out.plaid_id,
+                    environment=PLAID_ENV,
+                    initial_update_complete=True,
+                    historical_update_complete=True,
+                )
+                job_in = JobApiIn(
+                    name=SYNC_JOB_NAME,
+                    payload=req.model_dump(mode="json"),
+                    key=f"{SYNC_JOB_NAME}:{req.item_id}",
+                )
+                run_at = now + timedelta(
+                    seconds=random.uniform(0, settings.SYNC_JITTER_SECONDS)
+                )
+                CRUDJob.enqueue(db, job_in, run_at)
+            db.commit()
+        if user_institution_links_out:
+            logger.info("Scheduled %s syncs", len(user_institution_links_out))
+        return len(user_institution_links_out)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info("Scheduler started")
+        while not self.stopped.is_set():
+            try:
+                if self.schedule() == settings.SCHEDULER_BATCH_SIZE:
+                    continue
+            except Exception:
+                # Database unavailable, keep polling until it comes back
+                logger.exception("Failed to schedule syncs")
+            self.stopped.wait(settings.SCHEDULER_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    Scheduler().run()
@@ -12,6 +12,7 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from datetime import date
 from decimal import Decimal
 from typing import Annotated, Any, Literal
 
@@ -59,7 +60,8 @@ class __InstitutionalAccount(__AccountBase):
     mask: str
 
 
-class __NonInstitutionalAccount(__AccountBase): ...
+class __NonInstitutionalAccount(__AccountBase):
+    ...
 
 
 class __Depository(__InstitutionalAccount):
@@ -197,3 +199,19 @@ AccountPlaidOut = (
     | InvestmentPlaidOut
     | BrokeragePlaidOut
 )
+
+
+class AccountBalanceApiOut(BaseModel):
+    account_id: int
+    timestamp: date
+    balance: Decimal
+
+
+class BalancePointApiOut(BaseModel):
+    timestamp: date
+    balance: Decimal
+
+
+class NetWorthApiOut(BaseModel):
+    total: list[BalancePointApiOut]
+    accounts: dict[int, list[BalancePointApiOut]]
@@ -15,6 +15,7 @@
 import logging
 import re
 from typing import (
+    Any,
     TypeVar,
     Annotated,
 )
@@ -38,7 +39,7 @@ class ApiOutMixin(BaseModel):
 
 class PlaidInMixin(ApiInMixin):
     plaid_id: str
-    plaid_metadata: str
+    plaid_metadata: dict[str, Any]
 
 
 class PlaidOutMixin(PlaidInMixin, ApiOutMixin): ...
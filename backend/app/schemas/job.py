@@ -0,0 +1,42 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+from typing import Any, Literal
+
+from pydantic import BaseModel
+
+from app.schemas.common import ApiInMixin, ApiOutMixin
+
+JobStatus = Literal["pending", "running", "dead"]
+
+
+class __JobBase(BaseModel):
+    name: str
+    payload: dict[str, Any]
+    key: str | None = None
+
+
+class JobApiIn(__JobBase, ApiInMixin):
+    ...
+
+
+class JobApiOut(__JobBase, ApiOutMixin):
+    status: JobStatus
+    attempts: int
+    run_at: datetime
+    locked_at: datetime | None
+    last_error: str | None
+    created: datetime
@@ -0,0 +1,31 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from pydantic import BaseModel, computed_field
+
+
+class PlaidEndpointStatsApiOut(BaseModel):
+    endpoint: str
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    seconds: float = 0
+    max_seconds: float = 0
+    throttled_seconds: float = 0
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.calls if self.calls else 0
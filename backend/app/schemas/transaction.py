@@ -30,6 +30,10 @@ from app.schemas.common import (
 if TYPE_CHECKING:
     pass
 
+# Response headers of the cursors around a page of transactions
+PREV_CURSOR_HEADER = "X-Prev-Cursor"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 
 class __TransactionBase(BaseModel):
     timestamp: date
@@ -62,6 +66,8 @@ class TransactionQueryArg(BaseModel):
     search: str | None = None
     per_page: int = 0
     page: int = 0
+    after: str | None = None
+    before: str | None = None
     order_by: Literal[
         "id__asc",
         "id__desc",
@@ -14,7 +14,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from typing import TYPE_CHECKING
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, computed_field
 
 from app.schemas.common import (
     ApiInMixin,
@@ -22,10 +22,15 @@ from app.schemas.common import (
     PlaidOutMixin,
     SyncableApiOutMixin,
 )
+from app.settings import settings
 
 if TYPE_CHECKING:
     pass
 
+# Each sync holds a pooled connection, and another one while it fetches missing
+# exchange rates, so more workers would wait for the pool and fail
+MAX_SYNC_WORKERS = (settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW) // 2
+
 
 class __UserInstitutionLinkBase(BaseModel):
     ...
@@ -52,3 +57,38 @@ class UserInstitutionLinkPlaidIn(__SyncedUserInstitutionLinkBase, PlaidInMixin):
 class UserInstitutionLinkPlaidOut(__SyncedUserInstitutionLinkBase, PlaidOutMixin):
     institution_id: int
     user_id: int
+
+
+class SyncManyReq(BaseModel):
+    workers: int = Field(4, ge=1, le=MAX_SYNC_WORKERS)
+    workers_per_user: int = Field(1, ge=1, le=MAX_SYNC_WORKERS)
+
+
+class SyncReportApiOut(BaseModel):
+    items: int = 0
+    succeeded: int = 0
+    skipped: int = 0
+    failed: int = 0
+    transactions: int = 0
+    seconds: float = 0
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.seconds if self.seconds else 0
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def transactions_per_second(self) -> float:
+        return self.transactions / self.seconds if self.seconds else 0
+
+
+class ResetReportApiOut(BaseModel):
+    transactions: int = 0
+    updated: int = 0
+    seconds: float = 0
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def transactions_per_second(self) -> float:
+        return self.transactions / self.seconds if self.seconds else 0
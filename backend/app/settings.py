@@ -29,6 +29,9 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "QuartOS"
 
     DATABASE_URL: PostgresDsn = Field(default=...)
+    # Connections of each process, SQLAlchemy's defaults
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
     FIRST_SUPERUSER: EmailStr = Field(default=...)
@@ -39,6 +42,33 @@ class Settings(BaseSettings):
     GOOGLE_API_KEY: str = Field(default=...)
     GOOGLE_SITE_KEY: str = Field(default=...)
 
+    JOB_MAX_ATTEMPTS: int = 8
+    JOB_RETRY_DELAY_SECONDS: int = 30
+    JOB_RETRY_MAX_DELAY_SECONDS: int = 60 * 60
+    JOB_TIMEOUT_SECONDS: int = 60 * 60
+    JOB_POLL_SECONDS: float = 1
+    WEBHOOK_DEBOUNCE_SECONDS: int = 10
+    SYNC_INTERVAL_SECONDS: int = 6 * 60 * 60
+    SYNC_JITTER_SECONDS: int = 30 * 60
+    SYNC_MAX_BACKOFF_SECONDS: int = 7 * 24 * 60 * 60
+    SCHEDULER_POLL_SECONDS: float = 60
+    SCHEDULER_BATCH_SIZE: int = 100
+
+    # Never fetch exchange rates, only use the imported ones
+    EXCHANGE_RATES_OFFLINE: bool = False
+
+    PLAID_TRANSACTIONS_GET_WORKERS: int = 4
+    # Connections kept alive to Plaid per process, as many as FastAPI's 40
+    # threadpool workers so that concurrent requests do not wait on each other
+    PLAID_POOL_MAXSIZE: int = 40
+    PLAID_CONNECT_TIMEOUT_SECONDS: float = 5
+    PLAID_READ_TIMEOUT_SECONDS: float = 60
+    # The API and the worker both call Plaid, each with its own rate limiter
+    PLAID_RATE_LIMIT_SHARE: float = 0.5
+    PLAID_MAX_RETRIES: int = 4
+    PLAID_RETRY_DELAY_SECONDS: float = 1
+    PLAID_RETRY_MAX_DELAY_SECONDS: float = 30
+
     class Config:
         case_sensitive = True
 
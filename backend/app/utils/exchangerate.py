@@ -13,28 +13,273 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import csv
+import json
+import logging
 import os
-from datetime import date
-from decimal import Decimal
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, BinaryIO, Iterable, Mapping
 
-import requests_cache
+import requests
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
 
-OPEN_EXCHANGE_RATES_ID = os.environ["OPEN_EXCHANGE_RATES_ID"]
+from app.crud.exchangerate import CRUDExchangeRate
+from app.database.deps import engine
+from app.exceptions.exchangerate import ExchangeRateNotFound
+from app.schemas.exchangerate import ExchangeRateImportApiOut
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+OPEN_EXCHANGE_RATES_ID = os.environ.get("OPEN_EXCHANGE_RATES_ID")
 BASE_URL = "https://openexchangerates.org/api"
+# Days of rates kept in memory, about 170 currencies each
+EXCHANGE_RATE_CACHE_DAYS = 512
+TIMEOUT_SECONDS = 30
+
+
+def is_offline() -> bool:
+    # Offline, rates only come from the exchange_rate table
+    return settings.EXCHANGE_RATES_OFFLINE or not OPEN_EXCHANGE_RATES_ID
+
+
+def fetch_usd_rates(timestamp: date) -> dict[str, Decimal]:
+    api_url = f"{BASE_URL}/historical/{timestamp.isoformat()}.json"
+    response = requests.get(
+        api_url, params={"app_id": OPEN_EXCHANGE_RATES_ID}, timeout=TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    data = json.loads(response.text, parse_float=Decimal)
+    return {
+        currency_code: Decimal(rate) for currency_code, rate in data["rates"].items()
+    }
+
+
+class RatesCache:
+    # Least recently used days of rates, shared by the threads of a process
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.rates: OrderedDict[date, Mapping[str, Decimal]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, timestamp: date) -> Mapping[str, Decimal] | None:
+        with self.lock:
+            rates = self.rates.get(timestamp)
+            if rates is not None:
+                self.rates.move_to_end(timestamp)
+            return rates
+
+    def clear(self) -> None:
+        with self.lock:
+            self.rates.clear()
+
+    def put(self, timestamp: date, rates: Mapping[str, Decimal]) -> None:
+        with self.lock:
+            self.rates[timestamp] = rates
+            self.rates.move_to_end(timestamp)
+            while len(self.rates) > self.maxsize:
+                self.rates.popitem(last=False)
+
+
+rates_cache = RatesCache(EXCHANGE_RATE_CACHE_DAYS)
+
+
+def get_many_usd_rates(
+    timestamps: Iterable[date],
+) -> dict[date, Mapping[str, Decimal]]:
+    # Rates per US dollar of each distinct day, from memory, then from the
+    # exchange_rate table in one query, then fetched for the days still missing,
+    # every currency of a fetched day being stored at once
+    rates: dict[date, Mapping[str, Decimal]] = {}
+    missing = []
+    for timestamp in set(timestamps):
+        cached = rates_cache.get(timestamp)
+        if cached is None:
+            missing.append(timestamp)
+        else:
+            rates[timestamp] = cached
+    if not missing:
+        return rates
+    with Session(engine) as db:
+        stored = CRUDExchangeRate.read_rates(db, missing)
+        for timestamp in sorted(set(missing) - stored.keys()):
+            if is_offline():
+                # Past the imported days, or on a day they lack
+                previous = CRUDExchangeRate.read_previous_rates(db, timestamp)
+                if not previous:
+                    raise ExchangeRateNotFound(timestamp)
+                stored[timestamp] = previous[1]
+                continue
+            logger.info("Fetching exchange rates of %s", timestamp)
+            stored[timestamp] = fetch_usd_rates(timestamp)
+            CRUDExchangeRate.create_rates(db, {timestamp: stored[timestamp]})
+            db.commit()
+    for timestamp, day_rates in stored.items():
+        rates_cache.put(timestamp, day_rates)
+    rates.update(stored)
+    return rates
+
+
+def store_usd_rates(db: Session, timestamps: Select[tuple[date]]) -> None:
+    # Fetches and stores the rates of the days queried that are not stored yet,
+    # so that SQL can join them. Offline, the previous days stored stand in
+    if is_offline():
+        return
+    missing = CRUDExchangeRate.read_missing_timestamps(db, timestamps)
+    if missing:
+        get_many_usd_rates(missing)
+
+
+def get_usd_rates(timestamp: date) -> Mapping[str, Decimal]:
+    return get_many_usd_rates([timestamp])[timestamp]
 
 
 def get_exchange_rate(from_currency: str, to_currency: str, date: date) -> Decimal:
     if from_currency == to_currency:
         return Decimal(1)
+    rates = get_usd_rates(date)
+    if from_currency not in rates or to_currency not in rates:
+        raise ExchangeRateNotFound(date)
+    return rates[to_currency] / rates[from_currency]
+
+
+def get_exchange_rates(
+    from_currency: str, to_currency: str, dates: Iterable[date]
+) -> dict[date, Decimal]:
+    # Rate of each distinct day, resolved together
+    if from_currency == to_currency:
+        return {d: Decimal(1) for d in dates}
+    exchange_rates = {}
+    for d, rates in get_many_usd_rates(dates).items():
+        if from_currency not in rates or to_currency not in rates:
+            raise ExchangeRateNotFound(d)
+        exchange_rates[d] = rates[to_currency] / rates[from_currency]
+    return exchange_rates
+
+
+def __parse_rate(value: Any) -> Decimal | None:
+    try:
+        rate = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+    return rate if rate.is_finite() and rate > 0 else None
+
+
+def __parse_rates(rates: Mapping[str, Any]) -> dict[str, Decimal]:
+    parsed = {
+        currency_code.strip().upper(): __parse_rate(rate)
+        for currency_code, rate in rates.items()
+        if currency_code and currency_code.strip()
+    }
+    return {c: rate for c, rate in parsed.items() if rate is not None}
+
+
+def __read_rates_json(
+    file: BinaryIO,
+) -> Iterable[tuple[date, str | None, dict[str, Decimal]]]:
+    # Either openexchangerates historical files, alone or in a list, or a
+    # mapping of ISO dates to rates
+    data = json.load(file, parse_float=Decimal)
+    if isinstance(data, dict) and "rates" in data:
+        data = [data]
+    if isinstance(data, list):
+        for day in data:
+            if "date" in day:
+                timestamp = date.fromisoformat(day["date"])
+            else:
+                timestamp = datetime.fromtimestamp(
+                    day["timestamp"], timezone.utc
+                ).date()
+            yield timestamp, day.get("base"), __parse_rates(day["rates"])
+    else:
+        for day, rates in data.items():
+            yield date.fromisoformat(day), None, __parse_rates(rates)
+
+
+def __read_rates_csv(
+    file: BinaryIO,
+) -> Iterable[tuple[date, str | None, dict[str, Decimal]]]:
+    # Either one row per day and one column per currency after the date, as in
+    # the ECB history, or date, currency_code and rate columns
+    reader = csv.reader(file.read().decode("utf-8-sig").splitlines())
+    header = [h.strip().lower() for h in next(reader)]
+    if "currency_code" in header and "rate" in header:
+        columns = [header.index(c) for c in ("date", "currency_code", "rate")]
+        days: dict[date, dict[str, Any]] = {}
+        for row in reader:
+            if not row:
+                continue
+            day, currency_code, rate = (row[i].strip() for i in columns)
+            days.setdefault(date.fromisoformat(day), {})[currency_code] = rate
+        for timestamp, rates in days.items():
+            yield timestamp, None, __parse_rates(rates)
+        return
+    for row in reader:
+        if not row or not row[0].strip():
+            continue
+        rates = dict(zip(header[1:], row[1:]))
+        yield date.fromisoformat(row[0].strip()), None, __parse_rates(rates)
+
+
+def read_rates_file(
+    file: BinaryIO, filename: str, base_currency: str = "USD"
+) -> tuple[dict[date, dict[str, Decimal]], int]:
+    # Rates per US dollar of each day of a CSV or JSON dump, whose rates are per
+    # base_currency unless it tells otherwise, and the number of days skipped
+    # for lacking the US dollar to convert from another base
+    if filename.lower().endswith(".json"):
+        days = __read_rates_json(file)
+    else:
+        days = __read_rates_csv(file)
+    rates: dict[date, dict[str, Decimal]] = {}
+    skipped = 0
+    for timestamp, base, day_rates in days:
+        base = (base or base_currency).upper()
+        day_rates[base] = Decimal(1)
+        usd_rate = day_rates.get("USD")
+        if not usd_rate:
+            skipped += 1
+            continue
+        rates[timestamp] = {c: rate / usd_rate for c, rate in day_rates.items()}
+    return rates, skipped
+
+
+def fill_rate_gaps(
+    rates: Mapping[date, dict[str, Decimal]]
+) -> dict[date, dict[str, Decimal]]:
+    # Every day between the first and the last, each currency a day lacks (the
+    # whole day on weekends and holidays, or one missing from it) taking its
+    # rate of the nearest previous day that has it
+    if not rates:
+        return {}
+    filled: dict[date, dict[str, Decimal]] = {}
+    timestamp, last = min(rates), max(rates)
+    known: dict[str, Decimal] = {}
+    while timestamp <= last:
+        if timestamp in rates:
+            known = {**known, **rates[timestamp]}
+        filled[timestamp] = known
+        timestamp += timedelta(days=1)
+    return filled
 
-    api_url = (
-        f"{BASE_URL}/historical/{date.isoformat()}.json?app_id={OPEN_EXCHANGE_RATES_ID}"
-    )
 
-    with requests_cache.CachedSession(expire_after=None) as session:
-        response = session.get(api_url)
-        response.raise_for_status()
-        data = response.json()
-        from_rate = Decimal(data["rates"][from_currency])
-        to_rate = Decimal(data["rates"][to_currency])
-        return to_rate / from_rate
+def import_rates(
+    db: Session,
+    file: BinaryIO,
+    filename: str,
+    base_currency: str = "USD",
+    replace: bool = False,
+    fill: bool = True,
+) -> ExchangeRateImportApiOut:
+    # rates_cache is left to the caller to clear once db is committed
+    rates, skipped = read_rates_file(file, filename, base_currency)
+    report = ExchangeRateImportApiOut(days=len(rates), skipped_days=skipped)
+    filled = fill_rate_gaps(rates) if fill else rates
+    report.filled_days = len(filled) - len(rates)
+    report.rates = CRUDExchangeRate.create_rates(db, filled, replace)
+    logger.info("Imported exchange rates: %s", report)
+    return report
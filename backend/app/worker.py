@@ -0,0 +1,112 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import signal
+import time
+from types import FrameType
+from typing import Any, get_type_hints
+
+from fastapi import HTTPException, status
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.orm import Session
+
+from app import handlers
+from app.crud.job import CRUDJob
+from app.database.deps import engine
+from app.schemas.job import JobApiOut
+from app.schemas.webhook import WebhookReq
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    def __init__(self) -> None:
+        self.running = True
+
+    def stop(self, signum: int, frame: FrameType | None) -> None:
+        # Finish the current job before exiting
+        logger.info("Stopping worker...")
+        self.running = False
+
+    def run_job(self, job_out: JobApiOut) -> None:
+        handler = getattr(handlers, job_out.name)
+        req_type = get_type_hints(handler)["req"]
+        if req_type is Any:
+            req_type = WebhookReq
+        req = TypeAdapter(req_type).validate_python(job_out.payload)
+        with Session(engine) as db:
+            handler(req, db)
+            db.commit()
+
+    def work(self) -> bool:
+        # Claim and run the next due job, returns whether there was one
+        with Session(engine) as db:
+            job_out = CRUDJob.claim(db)
+            db.commit()
+        if not job_out:
+            return False
+        logger.info(
+            "Doing job %s %s, attempt %s", job_out.id, job_out.name, job_out.attempts
+        )
+        try:
+            self.run_job(job_out)
+        except Exception as e:
+            # Client errors other than conflicts will not fix themselves
+            retry = not isinstance(e, (AttributeError, ValidationError)) and not (
+                isinstance(e, HTTPException)
+                and e.status_code < 500
+                and e.status_code != status.HTTP_409_CONFLICT
+            )
+            logger.exception("Job %s failed", job_out.id)
+            with Session(engine) as db:
+                job_out = CRUDJob.fail(db, job_out.id, repr(e), retry)
+                db.commit()
+            if job_out.status == "dead":
+                logger.error("Job %s is dead: %s", job_out.id, job_out.last_error)
+        else:
+            with Session(engine) as db:
+                CRUDJob.ack(db, job_out.id)
+                db.commit()
+            logger.info("Done job %s", job_out.id)
+        return True
+
+    def recover(self) -> None:
+        with Session(engine) as db:
+            CRUDJob.recover(db)
+            db.commit()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info("Worker started")
+        recovered_at = 0.0
+        while self.running:
+            try:
+                if time.monotonic() - recovered_at > settings.JOB_TIMEOUT_SECONDS / 10:
+                    self.recover()
+                    recovered_at = time.monotonic()
+                if self.work():
+                    continue
+            except Exception:
+                # Database unavailable, keep polling until it comes back
+                logger.exception("Failed to poll the job queue")
+            time.sleep(settings.JOB_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    Worker().run()
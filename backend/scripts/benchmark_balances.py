@@ -0,0 +1,229 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare the set-based balance engine with the former row-by-row loop.
+
+Run from the backend directory against a scratch database:
+
+    python -m scripts.benchmark_balances --transactions 20000
+
+Everything is created inside a single transaction that is rolled back at the end.
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Callable
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.crud.transaction import CRUDTransaction
+from app.database.base import Base  # noqa
+from app.database.deps import engine
+from app.models.account import Account, PersonalLedger
+from app.models.bucket import Bucket
+from app.models.transaction import Transaction
+from app.models.user import User
+
+
+def legacy_update_account_balances(
+    db: Session, id: int, timestamp: date | None = None
+) -> None:
+    account = Account.read(db, id__eq=id)
+
+    if timestamp:
+        statement = Transaction.select(
+            account_id__eq=id, timestamp__lt=timestamp, order_by="timestamp__desc"
+        )
+        prev_transaction = db.scalars(statement).first()
+        if prev_transaction:
+            prev_balance = prev_transaction.account_balance
+        else:
+            prev_balance = account.initial_balance
+        statement = Transaction.select(
+            account_id__eq=id, timestamp__ge=timestamp, order_by="timestamp__asc"
+        )
+    else:
+        statement = Transaction.select(account_id__eq=id, order_by="timestamp__asc")
+        prev_balance = account.initial_balance
+
+    for transaction in db.scalars(statement).yield_per(50):
+        account_balance = prev_balance + transaction.amount
+        Transaction.update(db, transaction.id, account_balance=account_balance)
+        prev_balance = transaction.account_balance
+
+
+def create_account(db: Session, transactions: int, days: int) -> tuple[int, date]:
+    user = User.create(
+        db,
+        email="benchmark@quartos.com",
+        full_name="Benchmark",
+        hashed_password="",
+        is_superuser=False,
+        default_currency_code="EUR",
+    )
+    bucket = Bucket.create(db, name="Benchmark", user_id=user.id)
+    account = PersonalLedger.create(
+        db,
+        name="Benchmark",
+        currency_code="EUR",
+        initial_balance=Decimal(1000),
+        current_balance=Decimal(1000),
+        user_id=user.id,
+        default_bucket_id=bucket.id,
+    )
+    start = date.today() - timedelta(days=days)
+    rows = []
+    for i in range(transactions):
+        amount = Decimal(random.randint(-10000, 10000)) / 100
+        rows.append(
+            {
+                "amount": amount,
+                "amount_default_currency": amount,
+                "account_balance": Decimal(0),
+                "timestamp": start + timedelta(days=random.randrange(days)),
+                "name": f"Transaction {i}",
+                "account_id": account.id,
+                "bucket_id": bucket.id,
+            }
+        )
+    db.execute(insert(Transaction), rows)
+    return account.id, start
+
+
+def read_balances(db: Session, account_id: int) -> list[Decimal]:
+    statement = (
+        select(Transaction.account_balance)
+        .where(Transaction.account_id == account_id)
+        .order_by(Transaction.timestamp, Transaction.id)
+    )
+    return list(db.scalars(statement))
+
+
+def reset_balances(db: Session, account_id: int, timestamp: date) -> None:
+    db.execute(
+        update(Transaction)
+        .where(Transaction.account_id == account_id, Transaction.timestamp >= timestamp)
+        .values(account_balance=0)
+    )
+
+
+def add_amount(db: Session, transaction_id: int, delta: Decimal) -> None:
+    db.execute(
+        update(Transaction)
+        .where(Transaction.id == transaction_id)
+        .values(amount=Transaction.amount + delta)
+    )
+
+
+def measure(
+    db: Session, account_id: int, label: str, f: Callable[[], None]
+) -> list[Decimal]:
+    statements = 0
+
+    def count(*args: Any) -> None:
+        nonlocal statements
+        statements += 1
+
+    db.expunge_all()
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", count)
+    start = time.perf_counter()
+    f()
+    db.flush()
+    elapsed = time.perf_counter() - start
+    event.remove(connection, "before_cursor_execute", count)
+    print(f"{label:<45} {elapsed:>10.3f} s {statements:>10} statements")
+    return read_balances(db, account_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=10 * 365)
+    parser.add_argument(
+        "--backdate",
+        type=float,
+        default=0.1,
+        help="fraction of the history the backdated edit goes back to",
+    )
+    args = parser.parse_args()
+
+    with Session(engine) as db:
+        account_id, start = create_account(db, args.transactions, args.days)
+        timestamp = start + timedelta(days=int(args.days * args.backdate))
+
+        for label, ts in [("full", None), (f"from {timestamp}", timestamp)]:
+            reset_balances(db, account_id, ts or start)
+            legacy = measure(
+                db,
+                account_id,
+                f"loop ({label})",
+                lambda: legacy_update_account_balances(db, account_id, ts),
+            )
+            reset_balances(db, account_id, ts or start)
+            set_based = measure(
+                db,
+                account_id,
+                f"set-based ({label})",
+                lambda: CRUDTransaction.update_account_balances(db, account_id, ts),
+            )
+            assert legacy == set_based, "balances differ"
+
+        # Single backdated update: recompute the tail vs shift it by the delta
+        transaction_id, transaction_timestamp = db.execute(
+            select(Transaction.id, Transaction.timestamp)
+            .where(
+                Transaction.account_id == account_id,
+                Transaction.timestamp >= timestamp,
+            )
+            .order_by(Transaction.timestamp, Transaction.id)
+            .limit(1)
+        ).one()
+        delta = Decimal("12.34")
+
+        add_amount(db, transaction_id, delta)
+        recomputed = measure(
+            db,
+            account_id,
+            "set-based (single update, recompute)",
+            lambda: CRUDTransaction.update_account_balances(
+                db, account_id, transaction_timestamp
+            ),
+        )
+        add_amount(db, transaction_id, -delta)
+        CRUDTransaction.update_account_balances(db, account_id, transaction_timestamp)
+
+        add_amount(db, transaction_id, delta)
+        shifted = measure(
+            db,
+            account_id,
+            "set-based (single update, delta shift)",
+            lambda: CRUDTransaction.shift_account_balances(
+                db,
+                account_id,
+                transaction_timestamp,
+                transaction_id,
+                delta,
+                include_self=True,
+            ),
+        )
+        assert recomputed == shifted, "balances differ"
+
+        db.rollback()
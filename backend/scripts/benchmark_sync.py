@@ -0,0 +1,244 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure a full transactions sync against the local Plaid stand-in.
+
+Run from the backend directory against a scratch database:
+
+    PLAID_ENV=local python -m scripts.benchmark_sync --transactions 20000
+
+Unless --external is given, the stand-in from scripts/fake_plaid.py is started in
+a subprocess on the port of PLAID_LOCAL_HOST, so that its CPU and memory are not
+measured. The user, institution link, accounts and transactions created are
+deleted at the end, or at the start of the next run if it did not finish.
+"""
+
+import argparse
+import multiprocessing
+import re
+import resource
+import socket
+import time
+import tracemalloc
+from collections import Counter
+from decimal import Decimal
+from typing import Any
+from urllib.parse import urlparse
+
+import uvicorn
+from plaid.model.accounts_get_request import AccountsGetRequest
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+
+from app.crud.institution import CRUDSyncableInstitution
+from app.crud.userinstitutionlink import CRUDSyncableUserInstitutionLink
+from app.database.base import Base  # noqa
+from app.database.deps import engine
+from app.models.account import (
+    Account,
+    Credit,
+    Depository,
+    InstitutionalAccount,
+    Loan,
+)
+from app.models.bucket import Bucket
+from app.models.institution import Institution
+from app.models.transaction import Transaction
+from app.models.user import User
+from app.models.userinstitutionlink import UserInstitutionLink
+from app.plaid.common import (
+    PLAID_ENV,
+    client,
+    host,
+    read_client_stats,
+    serialize_model,
+)
+from app.plaid.institution import fetch_institution
+from app.plaid.ratelimit import RateLimiter
+from app.plaid.syncscheduler import sync_user_institution_link
+from app.plaid.userinstitutionlink import fetch_user_institution_link
+from scripts.fake_plaid import add_fixture_arguments, create_app, load_fixture
+
+
+def serve(args: argparse.Namespace, port: int) -> None:
+    app = create_app(load_fixture(args), args.latency, args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def wait_for_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def create_user_institution_link(db: Session) -> int:
+    # Same steps as linking an item, with the stand-in accepting any token
+    user = User.create(
+        db,
+        email=f"benchmark-{time.time_ns()}@quartos.com",
+        full_name="Benchmark",
+        hashed_password="",
+        is_superuser=False,
+        default_currency_code="EUR",
+    )
+    bucket = Bucket.create(db, name="Benchmark", user_id=user.id)
+    institution_in = fetch_institution("ins_local")
+    institution = db.scalars(
+        select(Institution).where(Institution.plaid_id == institution_in.plaid_id)
+    ).one_or_none()
+    institution_id = (
+        institution.id
+        if institution
+        else CRUDSyncableInstitution.create(db, institution_in).id
+    )
+    user_institution_link_in = fetch_user_institution_link("access-local")
+    delete_user_institution_link(db, user_institution_link_in.plaid_id)
+    user_institution_link_out = CRUDSyncableUserInstitutionLink.create(
+        db, user_institution_link_in, institution_id=institution_id, user_id=user.id
+    )
+    # fetch_accounts does not set a default bucket, so create them from the
+    # response directly
+    response = client.accounts_get(AccountsGetRequest(access_token="access-local"))
+    for account in response.accounts:
+        account_model = {"depository": Depository, "credit": Credit, "loan": Loan}
+        account_model[account.type.value].create(
+            db,
+            plaid_id=account.account_id,
+            plaid_metadata=serialize_model(account),
+            mask=account.mask or "",
+            name=account.name,
+            currency_code=account.balances.iso_currency_code,
+            initial_balance=Decimal(0),
+            current_balance=Decimal(0),
+            user_institution_link_id=user_institution_link_out.id,
+            default_bucket_id=bucket.id,
+        )
+    db.commit()
+    return user_institution_link_out.id
+
+
+def delete_user_institution_link(db: Session, plaid_id: str | None) -> None:
+    # Delete the link of a previous run with everything created for it
+    user_institution_link = db.scalars(
+        select(UserInstitutionLink).where(UserInstitutionLink.plaid_id == plaid_id)
+    ).one_or_none()
+    if not user_institution_link:
+        return
+    user_id = user_institution_link.user_id
+    account_ids = select(Account.id).where(
+        InstitutionalAccount.user_institution_link_id == user_institution_link.id
+    )
+    db.execute(delete(Transaction).where(Transaction.account_id.in_(account_ids)))
+    db.execute(delete(Account).where(Account.id.in_(account_ids)))
+    db.execute(
+        delete(UserInstitutionLink).where(
+            UserInstitutionLink.id == user_institution_link.id
+        )
+    )
+    db.execute(delete(Bucket).where(Bucket.user_id == user_id))
+    db.execute(delete(User).where(User.id == user_id))
+    db.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_fixture_arguments(parser)
+    parser.add_argument(
+        "--external",
+        action="store_true",
+        help="use a stand-in already listening on PLAID_LOCAL_HOST",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="also trace the peak Python memory of the sync, which slows it down",
+    )
+    parser.add_argument(
+        "--rate-limit-share",
+        type=float,
+        default=0,
+        help="share of Plaid's rate limits to throttle to, not throttled by default",
+    )
+    args = parser.parse_args()
+    if PLAID_ENV != "local":
+        parser.error("PLAID_ENV must be local")
+    client.api_client.rate_limiter = RateLimiter(args.rate_limit_share)
+    port = urlparse(host).port or 80
+
+    server = None
+    if not args.external:
+        server = multiprocessing.Process(target=serve, args=(args, port), daemon=True)
+        server.start()
+    try:
+        wait_for_port(port)
+        with Session(engine) as db:
+            user_institution_link_id = create_user_institution_link(db)
+
+        statements: Counter[str] = Counter()
+
+        def count(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+            verb = statement.split(None, 1)[0]
+            match = re.search(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", statement)
+            statements[f"{verb} {match.group(1)}" if match else verb] += 1
+
+        event.listen(engine, "before_cursor_execute", count)
+        if args.tracemalloc:
+            tracemalloc.start()
+        start = time.perf_counter()
+        changes = sync_user_institution_link(user_institution_link_id)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Kilobytes on Linux
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        event.remove(engine, "before_cursor_execute", count)
+
+        # One cursor update is committed per page
+        pages = statements["UPDATE user_institution_link"]
+        total = sum(statements.values())
+        print(f"{'changes':<30} {changes:>12}")
+        print(f"{'pages':<30} {pages:>12}")
+        print(f"{'seconds':<30} {elapsed:>12.2f}")
+        print(f"{'changes/s':<30} {changes / elapsed:>12.1f}")
+        print(f"{'statements':<30} {total:>12}")
+        print(f"{'statements/page':<30} {total / max(pages, 1):>12.1f}")
+        print(f"{'peak RSS (MiB)':<30} {peak_rss / 2**10:>12.1f}")
+        if args.tracemalloc:
+            print(f"{'peak traced memory (MiB)':<30} {peak / 2**20:>12.1f}")
+        for statement, n in statements.most_common(10):
+            print(f"  {statement:<28} {n:>12}")
+        for stats in read_client_stats():
+            print(
+                f"  {stats.endpoint:<28} {stats.calls:>12} calls"
+                f" {stats.retries:>4} retries {stats.mean_seconds:>8.3f} s mean"
+                f" {stats.max_seconds:>8.3f} s max"
+                f" {stats.throttled_seconds:>8.3f} s throttled"
+            )
+
+        with Session(engine) as db:
+            user_institution_link_out = CRUDSyncableUserInstitutionLink.read(
+                db, id=user_institution_link_id
+            )
+            delete_user_institution_link(db, user_institution_link_out.plaid_id)
+    finally:
+        if server:
+            server.terminate()
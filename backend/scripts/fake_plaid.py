@@ -0,0 +1,369 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Local stand-in for the subset of the Plaid API used by the sync path.
+
+It serves /transactions/sync, /transactions/get, /accounts/get, /item/get and
+/institutions/get_by_id from a fixture, either generated or loaded from a JSON
+file of recorded Plaid objects. Point the backend at it with PLAID_ENV=local:
+
+    python -m scripts.fake_plaid --port 8001 --transactions 50000
+    PLAID_ENV=local PLAID_LOCAL_HOST=http://localhost:8001 uvicorn app.main:app
+
+The fixture format is {"institution": ..., "item": ..., "accounts": [...],
+"transactions": [...], "modified": [...], "removed": [...]}, each entry being
+the JSON Plaid returns for that object. /transactions/sync replays every
+transaction as added, then the modified ones, then the removed ids.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import uuid
+from datetime import date, timedelta
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+Fixture = dict[str, Any]
+
+# A tiny transparent PNG served as the icon of every category
+ICON = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082"
+)
+
+CATEGORIES = [
+    ("FOOD_AND_DRINK", "FOOD_AND_DRINK_GROCERIES"),
+    ("FOOD_AND_DRINK", "FOOD_AND_DRINK_RESTAURANT"),
+    ("TRANSPORTATION", "TRANSPORTATION_PUBLIC_TRANSIT"),
+    ("GENERAL_MERCHANDISE", "GENERAL_MERCHANDISE_ONLINE_MARKETPLACES"),
+    ("RENT_AND_UTILITIES", "RENT_AND_UTILITIES_GAS_AND_ELECTRICITY"),
+    ("INCOME", "INCOME_WAGES"),
+    ("TRANSFER_OUT", "TRANSFER_OUT_SAVINGS"),
+    ("ENTERTAINMENT", "ENTERTAINMENT_TV_AND_MOVIES"),
+]
+
+MERCHANTS = ["Mercadona", "Uber", "Amazon", "Iberdrola", "Netflix", "Renfe", "Zara"]
+
+
+def generate_account(i: int, currency_code: str) -> dict[str, Any]:
+    credit = i % 3 == 2
+    return {
+        "account_id": f"account-{i}",
+        "balances": {
+            "available": None,
+            "current": 1000.0,
+            "limit": 2000.0 if credit else None,
+            "iso_currency_code": currency_code,
+            "unofficial_currency_code": None,
+        },
+        "mask": f"{i:04d}",
+        "name": f"Account {i}",
+        "official_name": None,
+        "type": "credit" if credit else "depository",
+        "subtype": "credit card" if credit else "checking",
+    }
+
+
+def generate_transaction(
+    account_id: str, transaction_id: str, day: date, currency_code: str
+) -> dict[str, Any]:
+    primary, detailed = random.choice(CATEGORIES)
+    merchant = random.choice(MERCHANTS)
+    amount = round(
+        random.uniform(-2000, 2000) if primary == "INCOME" else random.uniform(1, 200),
+        2,
+    )
+    return {
+        "account_id": account_id,
+        "account_owner": None,
+        "amount": amount,
+        "iso_currency_code": currency_code,
+        "unofficial_currency_code": None,
+        "category": None,
+        "category_id": None,
+        "check_number": None,
+        "counterparties": [],
+        "date": day.isoformat(),
+        "datetime": None,
+        "authorized_date": day.isoformat(),
+        "authorized_datetime": None,
+        "location": {
+            "address": None,
+            "city": None,
+            "region": None,
+            "postal_code": None,
+            "country": None,
+            "lat": None,
+            "lon": None,
+            "store_number": None,
+        },
+        "name": f"{merchant.upper()} {random.randint(1000, 9999)}",
+        "merchant_name": merchant,
+        "merchant_entity_id": None,
+        "logo_url": None,
+        "website": None,
+        "payment_meta": {
+            "by_order_of": None,
+            "payee": None,
+            "payer": None,
+            "payment_method": None,
+            "payment_processor": None,
+            "ppd_id": None,
+            "reason": None,
+            "reference_number": None,
+        },
+        "payment_channel": "in store",
+        "pending": False,
+        "pending_transaction_id": None,
+        "personal_finance_category": {
+            "primary": primary,
+            "detailed": detailed,
+            "confidence_level": "HIGH",
+        },
+        "personal_finance_category_icon_url": f"/icons/{primary}.png",
+        "transaction_code": None,
+        "transaction_id": transaction_id,
+        "transaction_type": "place",
+    }
+
+
+def generate_fixture(
+    accounts: int = 3,
+    transactions: int = 10000,
+    days: int = 5 * 365,
+    modified: float = 0.0,
+    removed: float = 0.0,
+    currency_code: str = "EUR",
+    seed: int = 0,
+) -> Fixture:
+    random.seed(seed)
+    account_list = [generate_account(i, currency_code) for i in range(accounts)]
+    start = date.today() - timedelta(days=days)
+    transaction_list = [
+        generate_transaction(
+            random.choice(account_list)["account_id"],
+            f"transaction-{i}",
+            start + timedelta(days=random.randrange(days)),
+            currency_code,
+        )
+        for i in range(transactions)
+    ]
+    modified_list = [
+        {**t, "amount": round(t["amount"] * 1.1, 2), "pending": False}
+        for t in random.sample(transaction_list, int(transactions * modified))
+    ]
+    removed_list = [
+        t["transaction_id"]
+        for t in random.sample(transaction_list, int(transactions * removed))
+    ]
+    return {
+        "institution": {
+            "institution_id": "ins_local",
+            "name": "Local Bank",
+            "products": ["transactions"],
+            "country_codes": ["ES"],
+            "routing_numbers": [],
+            "oauth": False,
+        },
+        "item": {
+            "item_id": "item-local",
+            "institution_id": "ins_local",
+            "webhook": None,
+            "error": None,
+            "available_products": [],
+            "billed_products": ["transactions"],
+            "consent_expiration_time": None,
+            "update_type": "background",
+        },
+        "accounts": account_list,
+        "transactions": transaction_list,
+        "modified": modified_list,
+        "removed": removed_list,
+    }
+
+
+def create_app(fixture: Fixture, latency: float = 0, error_rate: float = 0) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = {}
+    # Sync changes in the order they are replayed, cursors being offsets in it
+    changes: list[tuple[str, Any]] = (
+        [("added", t) for t in fixture["transactions"]]
+        + [("modified", t) for t in fixture["modified"]]
+        + [("removed", {"transaction_id": t}) for t in fixture["removed"]]
+    )
+
+    @app.middleware("http")
+    async def delay(request: Request, call_next: Any) -> Response:
+        path = request.url.path
+        app.state.requests[path] = app.state.requests.get(path, 0) + 1
+        if latency:
+            await asyncio.sleep(latency)
+        if not path.startswith("/icons/") and random.random() < error_rate:
+            # Half rate limited, half failed on Plaid's side
+            if random.random() < 0.5:
+                status_code, error_type = 429, "RATE_LIMIT_EXCEEDED"
+            else:
+                status_code, error_type = 500, "API_ERROR"
+            return JSONResponse(
+                {
+                    "error_type": error_type,
+                    "error_code": error_type,
+                    "error_message": "simulated by fake_plaid",
+                    "display_message": None,
+                    "request_id": request_id(),
+                },
+                status_code=status_code,
+            )
+        response: Response = await call_next(request)
+        return response
+
+    def request_id() -> str:
+        return uuid.uuid4().hex
+
+    def with_icon_urls(request: Request, transactions: list[Any]) -> list[Any]:
+        base_url = str(request.base_url).rstrip("/")
+        return [
+            {
+                **t,
+                "personal_finance_category_icon_url": base_url
+                + t["personal_finance_category_icon_url"],
+            }
+            if t["personal_finance_category_icon_url"].startswith("/")
+            else t
+            for t in transactions
+        ]
+
+    @app.post("/transactions/sync")
+    async def transactions_sync(request: Request) -> dict[str, Any]:
+        body = await request.json()
+        count = (body.get("options") or {}).get("count") or body.get("count") or 100
+        offset = int(body.get("cursor") or 0)
+        page = changes[offset : offset + count]
+        return {
+            "added": with_icon_urls(request, [t for k, t in page if k == "added"]),
+            "modified": with_icon_urls(
+                request, [t for k, t in page if k == "modified"]
+            ),
+            "removed": [t for k, t in page if k == "removed"],
+            "next_cursor": str(offset + len(page)),
+            "has_more": offset + len(page) < len(changes),
+            "request_id": request_id(),
+        }
+
+    @app.post("/transactions/get")
+    async def transactions_get(request: Request) -> dict[str, Any]:
+        body = await request.json()
+        options = body.get("options") or {}
+        start_date, end_date = body["start_date"], body["end_date"]
+        transactions = [
+            t for t in fixture["transactions"] if start_date <= t["date"] <= end_date
+        ]
+        offset, count = options.get("offset", 0), options.get("count", 100)
+        return {
+            "accounts": fixture["accounts"],
+            "transactions": with_icon_urls(
+                request, transactions[offset : offset + count]
+            ),
+            "total_transactions": len(transactions),
+            "item": fixture["item"],
+            "request_id": request_id(),
+        }
+
+    @app.post("/accounts/get")
+    async def accounts_get() -> dict[str, Any]:
+        return {
+            "accounts": fixture["accounts"],
+            "item": fixture["item"],
+            "request_id": request_id(),
+        }
+
+    @app.post("/item/get")
+    async def item_get() -> dict[str, Any]:
+        return {"item": fixture["item"], "request_id": request_id()}
+
+    @app.post("/institutions/get_by_id")
+    async def institutions_get_by_id() -> dict[str, Any]:
+        return {"institution": fixture["institution"], "request_id": request_id()}
+
+    @app.get("/icons/{name}")
+    async def icon(name: str) -> Response:
+        return Response(ICON, media_type="image/png")
+
+    return app
+
+
+def add_fixture_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--fixture", help="JSON file of recorded Plaid objects")
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=5 * 365)
+    parser.add_argument(
+        "--modified", type=float, default=0, help="fraction of modified transactions"
+    )
+    parser.add_argument(
+        "--removed", type=float, default=0, help="fraction of removed transactions"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds added to every request"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="fraction of requests answered with a rate limit or server error",
+    )
+
+
+def load_fixture(args: argparse.Namespace) -> Fixture:
+    if args.fixture:
+        with open(args.fixture) as f:
+            fixture: Fixture = json.load(f)
+        fixture.setdefault("modified", [])
+        fixture.setdefault("removed", [])
+        return fixture
+    return generate_fixture(
+        args.accounts,
+        args.transactions,
+        args.days,
+        args.modified,
+        args.removed,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_fixture_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--save-fixture", help="write the fixture to this file")
+    args = parser.parse_args()
+
+    fixture = load_fixture(args)
+    if args.save_fixture:
+        with open(args.save_fixture, "w") as f:
+            json.dump(fixture, f)
+    uvicorn.run(
+        create_app(fixture, args.latency, args.error_rate),
+        host=args.host,
+        port=args.port,
+    )
@@ -0,0 +1,64 @@
+# Copyright (C) 2024 Alexandre Amat
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Load historical exchange rates from local dumps into the exchange_rate table.
+
+Run from the backend directory:
+
+    python -m scripts.import_exchange_rates eurofxref-hist.csv --base EUR
+
+Files are CSV, one row per day with a column per currency as in the ECB history
+or date, currency_code and rate columns, or JSON, openexchangerates historical
+files or a mapping of dates to rates. Days missing between the first and the
+last one take the rates of the previous day. With EXCHANGE_RATES_OFFLINE set,
+or without OPEN_EXCHANGE_RATES_ID, lookups are then served from the table only.
+"""
+
+import argparse
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.database.base import Base  # noqa
+from app.database.deps import engine
+from app.utils.exchangerate import import_rates, rates_cache
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument(
+        "--base",
+        default="USD",
+        help="currency the rates are expressed in, unless a JSON file tells it",
+    )
+    parser.add_argument(
+        "--replace", action="store_true", help="overwrite the rates already stored"
+    )
+    parser.add_argument(
+        "--no-fill", action="store_true", help="do not fill the days missing"
+    )
+    args = parser.parse_args()
+
+    with Session(engine) as db:
+        for filename in args.files:
+            with open(filename, "rb") as f:
+                report = import_rates(
+                    db, f, filename, args.base, args.replace, not args.no_fill
+                )
+            db.commit()
+            rates_cache.clear()
+            print(f"{filename}: {report}")
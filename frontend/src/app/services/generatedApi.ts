@@ -203,6 +203,20 @@ const injectedRtkApi = api
         query: () => ({ url: `/categories/` }),
         providesTags: ["categories"],
       }),
+      readExchangeRatesExchangeRateManyGet: build.query<
+        ReadExchangeRatesExchangeRateManyGetApiResponse,
+        ReadExchangeRatesExchangeRateManyGetApiArg
+      >({
+        query: (queryArg) => ({
+          url: `/exchange_rate/many`,
+          params: {
+            from_currency: queryArg.fromCurrency,
+            to_currency: queryArg.toCurrency,
+            dates: queryArg.dates,
+          },
+        }),
+        providesTags: ["exchange_rate"],
+      }),
       readExchangeRateExchangeRateGet: build.query<
         ReadExchangeRateExchangeRateGetApiResponse,
         ReadExchangeRateExchangeRateGetApiArg
@@ -542,6 +556,8 @@ const injectedRtkApi = api
             search: queryArg.search,
             per_page: queryArg.perPage,
             page: queryArg.page,
+            after: queryArg.after,
+            before: queryArg.before,
             order_by: queryArg.orderBy,
             id__eq: queryArg.idEq,
             timestamp__eq: queryArg.timestampEq,
@@ -667,7 +683,10 @@ const injectedRtkApi = api
         >({
           query: (queryArg) => ({
             url: `/users/me/analytics/detailed/${queryArg.timestampGe}/${queryArg.timestampLt}`,
-            params: { bucket_id: queryArg.bucketId },
+            params: {
+              bucket_id: queryArg.bucketId,
+              currency_code: queryArg.currencyCode,
+            },
           }),
           providesTags: ["users", "analytics"],
         }),
@@ -682,6 +701,35 @@ const injectedRtkApi = api
             bucket_id: queryArg.bucketId,
             page: queryArg.page,
             per_page: queryArg.perPage,
+            currency_code: queryArg.currencyCode,
+          },
+        }),
+        providesTags: ["users", "analytics"],
+      }),
+      getManyBalancesUsersMeAnalyticsBalancesGet: build.query<
+        GetManyBalancesUsersMeAnalyticsBalancesGetApiResponse,
+        GetManyBalancesUsersMeAnalyticsBalancesGetApiArg
+      >({
+        query: (queryArg) => ({
+          url: `/users/me/analytics/balances`,
+          params: {
+            timestamps: queryArg.timestamps,
+            account_ids: queryArg.accountIds,
+          },
+        }),
+        providesTags: ["users", "analytics"],
+      }),
+      getNetWorthUsersMeAnalyticsNetWorthGet: build.query<
+        GetNetWorthUsersMeAnalyticsNetWorthGetApiResponse,
+        GetNetWorthUsersMeAnalyticsNetWorthGetApiArg
+      >({
+        query: (queryArg) => ({
+          url: `/users/me/analytics/net-worth`,
+          params: {
+            granularity: queryArg.granularity,
+            timestamp__ge: queryArg.timestampGe,
+            timestamp__lt: queryArg.timestampLt,
+            max_points: queryArg.maxPoints,
           },
         }),
         providesTags: ["users", "analytics"],
@@ -957,6 +1005,8 @@ const injectedRtkApi = api
             search: queryArg.search,
             per_page: queryArg.perPage,
             page: queryArg.page,
+            after: queryArg.after,
+            before: queryArg.before,
             order_by: queryArg.orderBy,
             id__eq: queryArg.idEq,
             timestamp__eq: queryArg.timestampEq,
@@ -1083,7 +1133,7 @@ export type ReadManyAdminUserInstitutionLinksUserInstitutionLinkIdTransactionsSt
     endDate: string;
   };
 export type ResetManyTransactionsToMetadataAdminUserInstitutionLinksUserInstitutionLinkIdResetToMetadataPutApiResponse =
-  /** status 200 Successful Response */ TransactionPlaidOut[];
+  /** status 200 Successful Response */ ResetReportApiOut;
 export type ResetManyTransactionsToMetadataAdminUserInstitutionLinksUserInstitutionLinkIdResetToMetadataPutApiArg =
   number;
 export type ResetTransactionToMetadataAdminUserInstitutionLinksUserInstitutionLinkIdTransactionsTransactionIdResetToMetadataPutApiResponse =
@@ -1105,6 +1155,15 @@ export type ReadCategoriesCategoryIdGetApiArg = number;
 export type ReadManyCategoriesGetApiResponse =
   /** status 200 Successful Response */ CategoryApiOut[];
 export type ReadManyCategoriesGetApiArg = void;
+export type ReadExchangeRatesExchangeRateManyGetApiResponse =
+  /** status 200 Successful Response */ {
+    [key: string]: string;
+  };
+export type ReadExchangeRatesExchangeRateManyGetApiArg = {
+  fromCurrency: string;
+  toCurrency: string;
+  dates: string[];
+};
 export type ReadExchangeRateExchangeRateGetApiResponse =
   /** status 200 Successful Response */ string;
 export type ReadExchangeRateExchangeRateGetApiArg = {
@@ -1303,6 +1362,8 @@ export type ReadManyUsersMeAccountsAccountIdTransactionsGetApiArg = {
   search?: string | null;
   perPage?: number;
   page?: number;
+  after?: string | null;
+  before?: string | null;
   orderBy?:
     | "id__asc"
     | "id__desc"
@@ -1412,6 +1473,7 @@ export type GetDetailedPlStatementUsersMeAnalyticsDetailedTimestampGeTimestampLt
     timestampGe: string;
     timestampLt: string;
     bucketId?: number | null;
+    currencyCode?: string | null;
   };
 export type GetManyPlStatementsUsersMeAnalyticsGetApiResponse =
   /** status 200 Successful Response */ PlStatementApiOut[];
@@ -1420,6 +1482,21 @@ export type GetManyPlStatementsUsersMeAnalyticsGetApiArg = {
   bucketId?: number | null;
   page?: number;
   perPage?: number;
+  currencyCode?: string | null;
+};
+export type GetManyBalancesUsersMeAnalyticsBalancesGetApiResponse =
+  /** status 200 Successful Response */ AccountBalanceApiOut[];
+export type GetManyBalancesUsersMeAnalyticsBalancesGetApiArg = {
+  timestamps: string[];
+  accountIds?: number[];
+};
+export type GetNetWorthUsersMeAnalyticsNetWorthGetApiResponse =
+  /** status 200 Successful Response */ NetWorthApiOut;
+export type GetNetWorthUsersMeAnalyticsNetWorthGetApiArg = {
+  granularity?: "yearly" | "quarterly" | "monthly" | "weekly" | "daily";
+  timestampGe?: string | null;
+  timestampLt?: string | null;
+  maxPoints?: number | null;
 };
 export type ReadManyUsersMeBucketsGetApiResponse =
   /** status 200 Successful Response */ BucketApiOut[];
@@ -1544,6 +1621,8 @@ export type ReadManyUsersMeTransactionsGetApiArg = {
   search?: string | null;
   perPage?: number;
   page?: number;
+  after?: string | null;
+  before?: string | null;
   orderBy?:
     | "id__asc"
     | "id__desc"
@@ -1656,7 +1735,9 @@ export type OtherWebhookRew = {
 export type TransactionPlaidOut = {
   id: number;
   plaid_id: string;
-  plaid_metadata: string;
+  plaid_metadata: {
+    [key: string]: any;
+  };
   is_synced: boolean;
   timestamp: string;
   name: string;
@@ -1671,7 +1752,9 @@ export type TransactionPlaidOut = {
 };
 export type TransactionPlaidIn = {
   plaid_id: string;
-  plaid_metadata: string;
+  plaid_metadata: {
+    [key: string]: any;
+  };
   timestamp: string;
   name: string;
   category_id?: number | null;
@@ -1681,7 +1764,9 @@ export type TransactionPlaidIn = {
 export type UserInstitutionLinkPlaidOut = {
   id: number;
   plaid_id: string;
-  plaid_metadata: string;
+  plaid_metadata: {
+    [key: string]: any;
+  };
   access_token: string;
   cursor?: string | null;
   institution_id: number;
@@ -1689,13 +1774,21 @@ export type UserInstitutionLinkPlaidOut = {
 };
 export type TransactionPlaidIn2 = {
   plaid_id: string;
-  plaid_metadata: string;
+  plaid_metadata: {
+    [key: string]: any;
+  };
   timestamp: string;
   name: string;
   category_id?: number | null;
   bucket_id: number;
   amount: string;
 };
+export type ResetReportApiOut = {
+  transactions?: number;
+  updated?: number;
+  seconds?: number;
+  transactions_per_second: number;
+};
 export type Token = {
   access_token: string;
   token_type: string;
@@ -2007,6 +2100,21 @@ export type PlStatementApiOut = {
   income: string;
   expenses: string;
 };
+export type AccountBalanceApiOut = {
+  account_id: number;
+  timestamp: string;
+  balance: string;
+};
+export type BalancePointApiOut = {
+  timestamp: string;
+  balance: string;
+};
+export type NetWorthApiOut = {
+  total: BalancePointApiOut[];
+  accounts: {
+    [key: string]: BalancePointApiOut[];
+  };
+};
 export type BucketApiOut = {
   id: number;
   name: string;